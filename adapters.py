@@ -0,0 +1,281 @@
+"""
+    Spreading bulbs over several Bluetooth adapters
+
+    One radio only holds so many links and writes per second. A gateway with
+    several adapters (hci0, hci1, ...) can use all of them: AdapterScheduler
+    places each controller on an adapter (HueBleController(adapter=...),
+    passed through to BleakClient) and keeps the placement balanced.
+
+    Placement scores every healthy adapter by its share of used link slots
+    plus its write latency, an EWMA fed from the controllers' instrumentation
+    "write" samples (forgotten once the adapter has no bulbs left), relative
+    to saturation_latency. New bulbs go to the lowest score, and a failed
+    connect tries the next adapter.
+
+    rebalance(), run every interval seconds once started, moves bulbs off
+    adapters that are over their link limit or slower than
+    saturation_latency, as long as the target scores clearly better. An
+    adapter with failure_threshold connect failures or link drops in a row
+    counts as failed: its bulbs move elsewhere and it gets no new ones until
+    cooldown seconds have passed. The simulator's add_adapter provides
+    adapters to test against.
+"""
+
+import asyncio
+import time
+
+from instrumentation import Instrumentation
+
+
+class AdapterState:
+    __slots__ = ("name", "max_links", "controllers", "latency", "samples", "failures",
+                 "failed_at", "connects", "drops")
+
+    def __init__(self, name, max_links):
+        self.name = name
+        self.max_links = max_links
+        ## address -> controller placed here
+        self.controllers = {}
+        ## Write latency EWMA in seconds, None until the first sample
+        self.latency = None
+        self.samples = 0
+        ## Connect failures and link drops since the last good write or connect
+        self.failures = 0
+        self.failed_at = None
+        self.connects = 0
+        self.drops = 0
+
+    @property
+    def links(self):
+        ## Bulbs disconnected on purpose keep their placement but use no link
+        return sum(1 for controller in self.controllers.values() if not controller.closed)
+
+    def snapshot(self):
+        return {
+            "links": self.links,
+            "max_links": self.max_links,
+            "latency": self.latency,
+            "samples": self.samples,
+            "failed": self.failed_at is not None,
+            "connects": self.connects,
+            "drops": self.drops,
+        }
+
+
+class AdapterScheduler:
+    def __init__(self, adapters, max_links=7, saturation_latency=0.1, alpha=0.2,
+                 failure_threshold=3, cooldown=30.0, hysteresis=0.25):
+        ## adapters: names, or {name: max_links} when the radios differ
+        if not adapters:
+            raise ValueError("need at least one adapter")
+        limits = adapters if isinstance(adapters, dict) else {name: max_links for name in adapters}
+        self.adapters = {name: AdapterState(name, limit) for name, limit in limits.items()}
+        self.saturation_latency = saturation_latency
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        ## How much better a target's score must be before a bulb is moved
+        self.hysteresis = hysteresis
+
+        ## address -> adapter name
+        self.placement = {}
+        self.moves = 0
+        self._task = None
+
+    def _state(self, controller):
+        return self.adapters.get(self.placement.get(controller.address))
+
+    def available(self, name):
+        state = self.adapters[name]
+        if state.failed_at is None:
+            return True
+        if time.monotonic() - state.failed_at >= self.cooldown:
+            ## Give it another chance, one more failure marks it again
+            state.failed_at = None
+            state.failures = self.failure_threshold - 1
+            return True
+        return False
+
+    def score(self, state, extra_links=0):
+        ## Lower is better, an adapter at its link limit or saturation latency scores ~1 for that term
+        links = (state.links + extra_links) / state.max_links if state.max_links else 0.0
+        latency = (state.latency or 0.0) / self.saturation_latency
+        return links + latency
+
+    def best(self, exclude=()):
+        candidates = [
+            state for name, state in self.adapters.items()
+            if name not in exclude and self.available(name)
+            and (state.max_links is None or state.links < state.max_links)
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda state: self.score(state, 1)).name
+
+    def _assign(self, controller, name):
+        previous = self._state(controller)
+        if previous is not None:
+            previous.controllers.pop(controller.address, None)
+            if not previous.controllers:
+                ## Nothing left to sample it, an old estimate would keep it looking busy
+                previous.latency = None
+        self.adapters[name].controllers[controller.address] = controller
+        self.placement[controller.address] = name
+
+    def place(self, controller, exclude=()):
+        ## Pick an adapter for a controller that isn't connected yet
+        if controller.client is not None and controller.client.is_connected:
+            raise ValueError(f"{controller.address} is connected, use move() instead")
+        name = self.best(exclude)
+        if name is None:
+            raise RuntimeError(f"no adapter has a free link for {controller.address}")
+        self._assign(controller, name)
+        controller.adapter = name
+        controller.client = None
+        self._watch(controller)
+        return name
+
+    def _watch(self, controller):
+        if controller.instrumentation is None:
+            controller.instrumentation = Instrumentation()
+        if self._on_sample not in controller.instrumentation.sample_hooks:
+            controller.instrumentation.add_sample_hook(self._on_sample)
+        if self._on_disconnect not in controller.disconnect_callbacks:
+            controller.disconnect_callbacks.append(self._on_disconnect)
+
+    def _on_sample(self, address, characteristic, phase, seconds):
+        if phase != "write":
+            return
+        state = self.adapters.get(self.placement.get(address))
+        if state is None:
+            return
+        state.latency = seconds if state.latency is None else state.latency + self.alpha * (seconds - state.latency)
+        state.samples += 1
+        state.failures = 0
+
+    def _on_disconnect(self, controller):
+        state = self._state(controller)
+        if state is not None:
+            state.drops += 1
+            self._failure(state)
+
+    def _failure(self, state):
+        state.failures += 1
+        if state.failures >= self.failure_threshold and state.failed_at is None:
+            state.failed_at = time.monotonic()
+
+    def mark_failed(self, name):
+        state = self.adapters[name]
+        state.failures = self.failure_threshold
+        state.failed_at = time.monotonic()
+
+    async def connect(self, controller):
+        ## Place and connect, falling over to the next adapter when one refuses
+        tried = []
+        while True:
+            if controller.address not in self.placement or self.placement[controller.address] in tried:
+                name = self.best(exclude=tried)
+                if name is None:
+                    raise ConnectionError(f"no adapter could connect {controller.address}, tried {', '.join(tried)}")
+                self._assign(controller, name)
+                await controller.move_to_adapter(name)
+                self._watch(controller)
+            name = self.placement[controller.address]
+            state = self.adapters[name]
+            try:
+                connected = await controller.connect()
+            except Exception:
+                connected = False
+            if connected:
+                state.connects += 1
+                state.failures = 0
+                return name
+            self._failure(state)
+            tried.append(name)
+
+    async def connect_all(self, controllers, max_concurrency=8):
+        ## {address: adapter name or the exception} for every controller
+        slots = asyncio.Semaphore(max_concurrency)
+
+        async def one(controller):
+            async with slots:
+                try:
+                    return controller.address, await self.connect(controller)
+                except Exception as e:
+                    return controller.address, e
+
+        return dict(await asyncio.gather(*(one(controller) for controller in controllers)))
+
+    async def move(self, controller, name, connect=True):
+        ## Reconnect a bulb through another adapter, also brings up bulbs whose link was down
+        source = self.placement.get(controller.address)
+        self._assign(controller, name)
+        self._watch(controller)
+        self.moves += 1
+        state = self.adapters[name]
+        try:
+            connected = await controller.move_to_adapter(name)
+            if not connected and connect:
+                connected = await controller.connect()
+        except Exception:
+            connected = False
+        if connected:
+            state.connects += 1
+        elif connect:
+            self._failure(state)
+        return source, name, connected
+
+    def _overloaded(self, state):
+        if not self.available(state.name):
+            return True
+        if state.max_links is not None and state.links > state.max_links:
+            return True
+        return state.latency is not None and state.latency > self.saturation_latency
+
+    async def rebalance(self):
+        ## [(address, from, to, connected)] for every bulb moved
+        moved = []
+        for state in list(self.adapters.values()):
+            while self._overloaded(state):
+                ## Bulbs disconnected on purpose stay down where they are
+                movable = [controller for controller in state.controllers.values() if not controller.closed]
+                if not movable:
+                    break
+                target = self.best(exclude=[state.name])
+                if target is None:
+                    break
+                target_state = self.adapters[target]
+                failed = not self.available(state.name)
+                if not failed and self.score(target_state, 1) + self.hysteresis >= self.score(state):
+                    break
+                ## Prefer a bulb that has already lost its link
+                controller = min(movable, key=lambda c: c.client is not None and c.client.is_connected)
+                moved.append((controller.address, *await self.move(controller, target)))
+                if not failed:
+                    ## One bulb per pass, the latency estimate needs new samples first
+                    break
+        return moved
+
+    async def _run(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            await self.rebalance()
+
+    def start(self, interval=5.0):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        return {
+            "moves": self.moves,
+            "adapters": {name: state.snapshot() for name, state in self.adapters.items()},
+        }
@@ -0,0 +1,168 @@
+"""
+    Ambient light pipeline: frame source -> zone colors -> bulbs
+
+    Every stage is an async generator, so frames are pulled through one at a
+    time and a slow stage holds back the ones before it. Sources yield
+    (capture time, HxWx3 uint8 frame). zone_colors downsamples each frame and
+    averages it over a rows x cols grid with numpy, and convert_zones turns the
+    zone averages into payloads with one rgb_to_xy_batch call per gamut.
+
+    AmbientPipeline drives one bulb per zone. A bulb that still has a write in
+    flight when a new frame arrives simply skips that frame, so the bulbs
+    always show the newest frame instead of falling behind the video. The
+    pipeline records latency from frame capture to completed write. Each zone
+    is converted with its bulb's own gamut profile.
+"""
+
+import asyncio
+import time
+
+from codec import encode_brightness_level, encode_xy_batch
+from cue import BRIGHTNESS_UUID, COLOR_UUID, np, rgb_to_xy_batch
+from gamut import GAMUT_C
+
+
+async def raw_rgb_frames(path, width, height, fps=None):
+    ## Packed 8-bit RGB frames back to back in a file, e.g. ffmpeg -f rawvideo -pix_fmt rgb24
+    frame_size = width * height * 3
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    index = 0
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(frame_size)
+            if len(data) < frame_size:
+                return
+            yield time.perf_counter(), np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+            index += 1
+            await _pace(loop, start, index, fps)
+
+
+async def array_frames(frames, fps=None):
+    ## Any iterable of HxWx3 uint8 arrays
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for index, frame in enumerate(frames, 1):
+        yield time.perf_counter(), frame
+        await _pace(loop, start, index, fps)
+
+
+async def _pace(loop, start, index, fps):
+    if fps is None:
+        ## Still give the bulb writes a chance to run
+        await asyncio.sleep(0)
+        return
+    delay = start + index / fps - loop.time()
+    await asyncio.sleep(max(0.0, delay))
+
+
+def zone_colors(frame, rows=1, cols=1, step=4):
+    ## Mean color of each zone, returned as a (rows * cols, 3) uint8 array in row-major order
+    small = frame[::step, ::step]
+    height = small.shape[0] - small.shape[0] % rows
+    width = small.shape[1] - small.shape[1] % cols
+    if height == 0 or width == 0:
+        raise ValueError(f"frame {frame.shape} is too small for {rows}x{cols} zones at step {step}")
+
+    zones = small[:height, :width].reshape(rows, height // rows, cols, width // cols, 3)
+    means = zones.mean(axis=(1, 3), dtype=np.float64)
+    return np.rint(means).astype(np.uint8).reshape(rows * cols, 3)
+
+
+def xy_payloads(xy):
+    ## One COLOR_UUID payload per row
+    return [row.tobytes() for row in encode_xy_batch(xy, np)]
+
+
+async def extract_zones(frames, rows=1, cols=1, step=4):
+    async for captured, frame in frames:
+        yield captured, zone_colors(frame, rows, cols, step)
+
+
+def _convert(colors, gamuts):
+    if isinstance(gamuts, (list, tuple)):
+        ## One batch per distinct gamut, scattered back into zone order
+        xy = np.empty((len(colors), 2), dtype=np.float64)
+        brightness = np.empty(len(colors), dtype=np.float64)
+        for gamut in set(gamuts):
+            rows = [zone for zone, zone_gamut in enumerate(gamuts) if zone_gamut == gamut]
+            xy[rows], brightness[rows] = rgb_to_xy_batch(colors[rows], gamut)
+        return xy, brightness
+    return rgb_to_xy_batch(colors, gamuts)
+
+
+async def convert_zones(zones, gamuts=GAMUT_C):
+    ## Yields (capture time, color payloads, brightness payloads)
+    ## gamuts is one profile for every zone or a list with one per zone
+    async for captured, colors in zones:
+        xy, brightness = _convert(colors, gamuts)
+        levels = (np.clip(brightness, 0.0, 1.0) * 255).astype(np.uint8)
+        yield captured, xy_payloads(xy), [encode_brightness_level(level) for level in levels.tolist()]
+
+
+class AmbientPipeline:
+    def __init__(self, source, controllers, rows=1, cols=1, step=4, brightness=True):
+        ## controllers[i] shows zone i, zones are numbered row-major
+        if np is None:
+            raise ImportError("AmbientPipeline requires numpy")
+        if len(controllers) != rows * cols:
+            raise ValueError(f"need {rows * cols} controllers for {rows}x{cols} zones, got {len(controllers)}")
+        self.source = source
+        self.controllers = controllers
+        self.rows = rows
+        self.cols = cols
+        self.step = step
+        self.brightness = brightness
+
+        self.frames = 0
+        self.writes = 0
+        self.dropped = [0] * len(controllers)
+        self.errors = 0
+        self.latencies = []
+        self._in_flight = [None] * len(controllers)
+
+    async def run(self):
+        gamuts = [controller.gamut for controller in self.controllers]
+        if len(set(gamuts)) == 1:
+            gamuts = gamuts[0]
+        stream = convert_zones(extract_zones(self.source, self.rows, self.cols, self.step), gamuts)
+        loop = asyncio.get_running_loop()
+        try:
+            async for captured, colors, levels in stream:
+                self.frames += 1
+                for zone, controller in enumerate(self.controllers):
+                    task = self._in_flight[zone]
+                    if task is not None and not task.done():
+                        self.dropped[zone] += 1
+                        continue
+                    level = levels[zone] if self.brightness else None
+                    self._in_flight[zone] = loop.create_task(
+                        self._push(controller, captured, colors[zone], level))
+        finally:
+            pending = [task for task in self._in_flight if task is not None]
+            await asyncio.gather(*pending, return_exceptions=True)
+        return self.stats()
+
+    async def _push(self, controller, captured, color, level):
+        try:
+            await controller.write_payload(COLOR_UUID, color)
+            if level is not None:
+                await controller.write_payload(BRIGHTNESS_UUID, level)
+        except Exception:
+            self.errors += 1
+            return
+        self.writes += 1
+        self.latencies.append(time.perf_counter() - captured)
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        return {
+            "frames": self.frames,
+            "writes": self.writes,
+            "dropped": list(self.dropped),
+            "errors": self.errors,
+            "latency_mean": sum(latencies) / count if count else None,
+            "latency_p95": latencies[min(count - 1, int(count * 0.95))] if count else None,
+            "latency_max": latencies[-1] if count else None,
+        }
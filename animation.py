@@ -0,0 +1,177 @@
+"""
+    Smooth transitions
+
+    compile_transition interpolates between two colors in xy + brightness
+    space, clamping every step into the gamut, and packs every frame into its
+    final payload up front so playback does no conversion work at all.
+
+    Animator plays compiled frames through a pacer driven by the event loop's
+    monotonic clock. Frame times are computed from the start time rather than
+    by chaining sleeps, so there is no drift, and when a write takes longer
+    than a frame period the late frames are skipped instead of piling up.
+    Playing a new animation cancels the running one.
+"""
+
+import asyncio
+
+from codec import encode_brightness, encode_xy
+from cue import BRIGHTNESS_UUID, COLOR_UUID, rgb_to_xy
+from gamut import GAMUT_C
+
+
+def linear(t):
+    return t
+
+
+def ease_in(t):
+    return t * t
+
+
+def ease_out(t):
+    return t * (2 - t)
+
+
+def ease_in_out(t):
+    return 2 * t * t if t < 0.5 else 1 - 2 * (1 - t) * (1 - t)
+
+
+def smoothstep(t):
+    return t * t * (3 - 2 * t)
+
+
+EASINGS = {
+    "linear": linear,
+    "ease_in": ease_in,
+    "ease_out": ease_out,
+    "ease_in_out": ease_in_out,
+    "smoothstep": smoothstep,
+}
+
+
+class Animation:
+    def __init__(self, frames, fps):
+        ## frames: list of (color payload, brightness payload or None)
+        self.frames = frames
+        self.fps = fps
+
+    @property
+    def duration(self):
+        return len(self.frames) / self.fps
+
+    def __len__(self):
+        return len(self.frames)
+
+
+def compile_transition(start_rgb, end_rgb, duration, fps=20.0, easing="ease_in_out",
+                       start_brightness=None, end_brightness=None, gamut=GAMUT_C):
+    ## Brightness is in percent like HueBleController.set_brightness, None leaves it alone
+    ## gamut should be the target controller's, its .gamut
+    ease = EASINGS[easing] if isinstance(easing, str) else easing
+    count = max(2, int(round(duration * fps)) + 1)
+
+    start, _ = rgb_to_xy(*start_rgb, gamut)
+    end, _ = rgb_to_xy(*end_rgb, gamut)
+    if start_brightness is None:
+        start_brightness = end_brightness
+    if end_brightness is None:
+        end_brightness = start_brightness
+
+    frames = []
+    for i in range(count):
+        t = ease(i / (count - 1))
+        x, y = gamut.clamp(start.x + (end.x - start.x) * t, start.y + (end.y - start.y) * t)
+        color = encode_xy(x, y)
+
+        brightness = None
+        if start_brightness is not None:
+            percent = start_brightness + (end_brightness - start_brightness) * t
+            brightness = encode_brightness(percent)
+        frames.append((color, brightness))
+    return Animation(frames, fps)
+
+
+class AnimationReport:
+    __slots__ = ("target_fps", "achieved_fps", "sent", "skipped", "elapsed", "cancelled")
+
+    def __init__(self, target_fps):
+        self.target_fps = target_fps
+        self.achieved_fps = 0.0
+        self.sent = 0
+        self.skipped = 0
+        self.elapsed = 0.0
+        self.cancelled = False
+
+    def __repr__(self):
+        return (f"AnimationReport({self.achieved_fps:.1f}/{self.target_fps:.1f} fps, "
+                f"sent={self.sent}, skipped={self.skipped}, cancelled={self.cancelled})")
+
+
+class Animator:
+    def __init__(self, controller):
+        self.controller = controller
+        self.report = None
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def play(self, animation):
+        ## Replaces whatever is playing, returns a task resolving to an AnimationReport
+        if self.running:
+            self._task.cancel()
+        self._task = asyncio.get_running_loop().create_task(self._play(animation))
+        return self._task
+
+    async def cancel(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def wait(self):
+        if self._task is None:
+            return self.report
+        return await self._task
+
+    async def _play(self, animation):
+        loop = asyncio.get_running_loop()
+        report = AnimationReport(animation.fps)
+        self.report = report
+
+        frames = animation.frames
+        count = len(frames)
+        period = 1.0 / animation.fps
+        start = loop.time()
+        i = 0
+        try:
+            while i < count:
+                ## Jump to whichever frame is due now, the last frame is always sent
+                due = min(int((loop.time() - start) / period), count - 1)
+                if due > i:
+                    report.skipped += due - i
+                    i = due
+
+                color, brightness = frames[i]
+                if color is not None:
+                    await self.controller.write_payload(COLOR_UUID, color)
+                if brightness is not None:
+                    await self.controller.write_payload(BRIGHTNESS_UUID, brightness)
+                report.sent += 1
+                i += 1
+
+                delay = start + i * period - loop.time()
+                if delay > 0 and i < count:
+                    await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            report.cancelled = True
+            raise
+        finally:
+            report.elapsed = loop.time() - start
+            ## Through the end of the last frame's period, n frames take n periods
+            shown = max(report.elapsed, i * period)
+            if shown > 0:
+                report.achieved_fps = report.sent / shown
+        return report
@@ -0,0 +1,258 @@
+"""
+    Offline benchmarks
+
+    Times color conversion, gamut test and clamp, payload encoding, bulk
+    sweeps over the RGB cube and end-to-end commands per second through
+    HueBleController against simulated bulbs (simulator.py) with configurable
+    write latency. No bulb or Bluetooth adapter is needed.
+
+    python bench.py                      # everything, results to bench_results.json
+    python bench.py --quick -o run.json  # shorter runs
+    python bench.py --compare old.json   # print the change against an earlier run
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+import time
+import timeit
+
+import cue
+from codec import encode_brightness, encode_xy
+from cue import HueBleController, XyPoint, np, rgb_to_xy, rgb_to_xy_batch
+from encoder import EncoderInput, replay_events
+from gamut import GAMUT_C
+from simulator import SimulatedNetwork
+
+## Representative inputs
+COLORS = {
+    "in_gamut": (200, 120, 80),
+    "out_of_gamut": (0, 0, 255),
+    "black": (0, 0, 0),
+    "white": (255, 255, 255),
+}
+XY_POINTS = {
+    "in_gamut": (0.4, 0.4),
+    "out_of_gamut": (0.1, 0.1),
+}
+
+
+def _time_call(func, min_time):
+    ## Calls per second, growing the loop count until one run takes min_time
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    while elapsed < min_time:
+        number *= 2
+        elapsed = timer.timeit(number)
+    best = min(timer.repeat(3, number))
+    return {"ops_per_sec": number / best, "ns_per_op": best / number * 1e9}
+
+
+def bench_scalar(min_time):
+    results = {}
+    for name, (r, g, b) in COLORS.items():
+        results[f"rgb_to_xy.{name}"] = _time_call(lambda: rgb_to_xy(r, g, b), min_time)
+
+    for name, (x, y) in XY_POINTS.items():
+        point = XyPoint(x, y)
+        results[f"within_gamut.{name}"] = _time_call(point.within_gamut, min_time)
+        results[f"point_in_triangle.{name}"] = _time_call(point.point_in_triangle, min_time)
+        results[f"gamut_clamp.{name}"] = _time_call(lambda: GAMUT_C.clamp(x, y), min_time)
+
+    results["encode_xy"] = _time_call(lambda: encode_xy(0.3, 0.4), min_time)
+    results["encode_brightness"] = _time_call(lambda: encode_brightness(50), min_time)
+    return results
+
+
+def _cube(step):
+    levels = range(0, 256, step)
+    return [(r, g, b) for r in levels for g in levels for b in levels]
+
+
+def bench_sweep(step):
+    ## Whole RGB cube at the given stride, scalar and (if numpy is there) batch
+    results = {}
+    colors = _cube(step)
+
+    start = time.perf_counter()
+    for r, g, b in colors:
+        xy, _ = rgb_to_xy(r, g, b)
+        encode_xy(xy.x, xy.y)
+    elapsed = time.perf_counter() - start
+    results["sweep.scalar"] = {"colors": len(colors), "seconds": elapsed, "colors_per_sec": len(colors) / elapsed}
+
+    if np is not None:
+        rgb = np.asarray(colors, dtype=np.uint8)
+        start = time.perf_counter()
+        rgb_to_xy_batch(rgb)
+        elapsed = time.perf_counter() - start
+        results["sweep.batch"] = {"colors": len(colors), "seconds": elapsed, "colors_per_sec": len(colors) / elapsed}
+
+        if cue._native is not None:
+            ## Same sweep on the numpy path, the results have to be identical
+            expected = rgb_to_xy_batch(rgb)
+            native, cue._native = cue._native, None
+            try:
+                start = time.perf_counter()
+                actual = rgb_to_xy_batch(rgb)
+                elapsed = time.perf_counter() - start
+            finally:
+                cue._native = native
+            if not all(np.array_equal(a, e) for a, e in zip(actual, expected)):
+                raise AssertionError("native and numpy rgb_to_xy_batch disagree")
+            results["sweep.batch.numpy"] = {
+                "colors": len(colors), "seconds": elapsed, "colors_per_sec": len(colors) / elapsed,
+            }
+    return results
+
+
+async def _drive(controller, commands):
+    for i in range(commands):
+        await controller.set_colors_rgb(i & 0xFF, (i >> 8) & 0xFF, 255 - (i & 0xFF))
+
+
+async def bench_commands(latency, commands, scheduler_rate=None, stream_rate=None):
+    network = SimulatedNetwork(latency=latency, connect_latency=0.0, seed=0)
+    controller = HueBleController("00:00:00:00:00:00", client_factory=network.client_factory)
+    await controller.connect()
+    if scheduler_rate is not None:
+        controller.enable_scheduler(scheduler_rate)
+    if stream_rate is not None:
+        controller.enable_streaming(stream_rate)
+
+    start = time.perf_counter()
+    await _drive(controller, commands)
+    await controller.flush()
+    elapsed = time.perf_counter() - start
+    if controller.scheduler is not None:
+        await controller.scheduler.stop()
+
+    return {
+        "latency": latency,
+        "commands": commands,
+        "writes": network.stats()["writes"],
+        "seconds": elapsed,
+        "commands_per_sec": commands / elapsed,
+    }
+
+
+async def bench_filter(latency, commands):
+    ## Noisy sensor-like stream drifting slowly, with the perceptual change filter
+    network = SimulatedNetwork(latency=latency, connect_latency=0.0, seed=0)
+    controller = HueBleController("00:00:00:00:00:00", client_factory=network.client_factory)
+    await controller.connect()
+    change_filter = controller.enable_change_filter()
+    rng = random.Random(0)
+
+    start = time.perf_counter()
+    for i in range(commands):
+        drift = i * 100 // commands
+        await controller.set_colors_rgb(100 + drift + rng.randint(-2, 2), 80 + rng.randint(-2, 2), 200)
+    await controller.flush()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "latency": latency,
+        "commands": commands,
+        "writes": network.stats()["writes"],
+        "saved": change_filter.saved,
+        "seconds": elapsed,
+        "commands_per_sec": commands / elapsed,
+    }
+
+
+async def bench_encoder(latency, ticks, rate=1000.0):
+    ## Encoder ticks at rate per second against a link taking latency per write
+    network = SimulatedNetwork(latency=latency, connect_latency=0.0, seed=0)
+    controller = HueBleController("00:00:00:00:00:00", client_factory=network.client_factory)
+    await controller.connect()
+    encoder = EncoderInput(controller, replay_events([(i / rate, 1) for i in range(ticks)]))
+
+    start = time.perf_counter()
+    stats = await encoder.run()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "latency": latency,
+        "events": ticks,
+        "writes": stats["writes"],
+        "latency_p99": stats["latency_p99"],
+        "over_budget": stats["over_budget"],
+        "seconds": elapsed,
+        "events_per_sec": ticks / elapsed,
+    }
+
+
+def run(quick=False):
+    min_time = 0.05 if quick else 0.2
+    results = {
+        "meta": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "numpy": np.__version__ if np is not None else None,
+            "native": cue._native.path if cue._native is not None else None,
+            "time": time.time(),
+            "quick": quick,
+        },
+    }
+    results.update(bench_scalar(min_time))
+    results.update(bench_sweep(16 if quick else 4))
+
+    for latency in (0.0, 0.001, 0.005):
+        commands = 500 if quick or latency else 5000
+        key = f"commands.latency_{latency * 1000:g}ms"
+        results[key] = asyncio.run(bench_commands(latency, commands))
+    results["commands.latency_5ms.scheduled"] = asyncio.run(
+        bench_commands(0.005, 500 if quick else 2000, scheduler_rate=100.0))
+    results["commands.latency_5ms.stream"] = asyncio.run(
+        bench_commands(0.005, 500 if quick else 2000, stream_rate=1000.0))
+    results["commands.latency_5ms.filtered"] = asyncio.run(bench_filter(0.005, 500 if quick else 2000))
+    results["encoder.latency_5ms"] = asyncio.run(bench_encoder(0.005, 500 if quick else 2000))
+    return results
+
+
+def _rate(result):
+    for key in ("ops_per_sec", "colors_per_sec", "commands_per_sec", "events_per_sec"):
+        if key in result:
+            return key, result[key]
+    return None, None
+
+
+def report(results, baseline=None):
+    for name, result in results.items():
+        if name == "meta":
+            continue
+        key, rate = _rate(result)
+        line = f"{name:40s} {rate:14,.0f} {key}"
+        if baseline is not None and name in baseline:
+            _, old = _rate(baseline[name])
+            if old:
+                line += f"  ({(rate / old - 1) * 100:+.1f}%)"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline cue benchmarks")
+    parser.add_argument("-o", "--output", default="bench_results.json")
+    parser.add_argument("--quick", action="store_true", help="shorter runs")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    results = run(args.quick)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+    Wire format for every Hue BLE characteristic
+
+    POWER       1 byte, 0x00 off / 0x01 on
+    BRIGHTNESS  1 byte, 0-255 (set_brightness maps 0-100% onto it)
+    TEMP        2 bytes, color temperature in mireds, little endian
+    COLOR       4 bytes, x and y scaled to 0-65535, little endian
+                or the HSV-ish layout from huetesting.py: 0xfe, hue, saturation, 0x00
+
+    The encode_* functions return immutable bytes, so a payload can be kept,
+    queued or compared without copying. encode_xy_batch is the numpy version
+    of encode_xy for whole arrays of colors.
+"""
+
+import struct
+
+POWER_ON = b"\x01"
+POWER_OFF = b"\x00"
+
+## Every single-byte payload, so brightness never allocates
+_SINGLE_BYTES = tuple(bytes([value]) for value in range(256))
+
+MIN_MIREDS = 153
+MAX_MIREDS = 500
+
+_XY = struct.Struct("<HH")
+_FLAGGED_XY = struct.Struct("<BHH")
+_HSV = struct.Struct("<BBBB")
+_TEMP = struct.Struct("<H")
+
+## First byte of huetesting.py's color layouts, must be nonzero for the bulb to apply it
+HSV_WRITE_FLAG = 0xFE
+
+
+def _scale(value):
+    scaled = int(value * 65535)
+    return 0 if scaled < 0 else 65535 if scaled > 65535 else scaled
+
+
+def kelvin_to_mireds(kelvin):
+    return round(1_000_000 / kelvin)
+
+
+def mireds_to_kelvin(mireds):
+    return round(1_000_000 / mireds)
+
+
+def encode_power(on):
+    return POWER_ON if on else POWER_OFF
+
+
+def decode_power(payload):
+    return payload[0] != 0
+
+
+def brightness_level(percent):
+    return int(min(max(percent, 0), 100) * 255 / 100)
+
+
+def encode_brightness(percent):
+    return _SINGLE_BYTES[brightness_level(percent)]
+
+
+def encode_brightness_level(level):
+    return _SINGLE_BYTES[level]
+
+
+def decode_brightness(payload):
+    ## Percent, the inverse of brightness_level up to rounding
+    return payload[0] * 100 / 255
+
+
+def encode_temperature(mireds):
+    return _TEMP.pack(min(max(int(mireds), MIN_MIREDS), MAX_MIREDS))
+
+
+def decode_temperature(payload):
+    return _TEMP.unpack_from(payload)[0]
+
+
+def encode_xy(x, y):
+    return _XY.pack(_scale(x), _scale(y))
+
+
+def encode_xy_batch(xy, np):
+    ## (N, 2) xy array -> (N, 4) uint8 array, row i is encode_xy(*xy[i])
+    ## Truncates like int() in _scale, values outside 0-1 clamp to the ends
+    scaled = (np.clip(xy, 0.0, 1.0) * 65535).astype("<u2")
+    return scaled.view(np.uint8)
+
+
+def decode_xy(payload):
+    scaled_x, scaled_y = _XY.unpack_from(payload)
+    return scaled_x / 65535, scaled_y / 65535
+
+
+def encode_flagged_xy(x, y, flag=HSV_WRITE_FLAG):
+    return _FLAGGED_XY.pack(flag, _scale(x), _scale(y))
+
+
+def _hsv_bytes(hue, saturation):
+    ## hue: 0-360, saturation: 0-1
+    hue8 = int((min(max(hue, 0), 360) / 360) * 254)
+    sat8 = int(min(max(saturation, 0), 1) * 254)
+    return hue8, sat8
+
+
+def encode_hsv(hue, saturation):
+    return _HSV.pack(HSV_WRITE_FLAG, *_hsv_bytes(hue, saturation), 0x00)
+
+
+def decode_hsv(payload):
+    _, hue8, sat8, _ = _HSV.unpack_from(payload)
+    return hue8 * 360 / 254, sat8 / 254
+
+
+def is_hsv(payload):
+    ## Which COLOR layout a payload uses, an xy payload would need y < 0.004 to look like this,
+    ## far below the blue corner of every gamut
+    return len(payload) == _HSV.size and payload[0] == HSV_WRITE_FLAG and payload[3] == 0
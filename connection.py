@@ -0,0 +1,167 @@
+"""
+    Persistent connection with automatic reconnect
+
+    ConnectionManager keeps a controller's link up for as long as the manager
+    is running. Link drops are picked up through bleak's disconnected
+    callback and trigger a background reconnect with jittered exponential
+    backoff. Writes issued while the link is down are held, latest value per
+    characteristic, and replayed once the link is back, before it counts
+    as connected again so a newer write can't be overtaken by an older held
+    one. controller.disconnect() on a managed controller stops the manager
+    too, a deliberate disconnect is never reconnected.
+"""
+
+import asyncio
+import logging
+import random
+import time
+
+log = logging.getLogger("cue.connection")
+
+
+class ConnectionManager:
+    def __init__(self, controller, base_delay=0.5, max_delay=30.0, jitter=0.5):
+        self.controller = controller
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        ## Fraction of each backoff delay that is randomized, 0 disables jitter
+        self.jitter = jitter
+
+        self._held = {}
+        self._connected = asyncio.Event()
+        self._reconnect_task = None
+        self._running = False
+
+        ## Metrics
+        self.reconnects = 0
+        self.attempts = 0
+        self.drops = 0
+        self.held_writes = 0
+        self.last_reconnect_latency = None
+        self.reconnect_latencies = []
+        self._up_since = None
+        self._down_since = None
+        self._uptime = 0.0
+
+    @property
+    def connected(self):
+        return self._connected.is_set()
+
+    async def start(self):
+        ## Connect, retrying with backoff until the link is up
+        self._running = True
+        self.controller.connection = self
+        if self._on_disconnect not in self.controller.disconnect_callbacks:
+            self.controller.disconnect_callbacks.append(self._on_disconnect)
+
+        self._down_since = time.monotonic()
+        self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+        await self._connected.wait()
+
+    async def stop(self):
+        self._running = False
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            try:
+                await self._reconnect_task
+            except asyncio.CancelledError:
+                pass
+            self._reconnect_task = None
+
+        self._mark_down()
+        self._held.clear()
+        if self._on_disconnect in self.controller.disconnect_callbacks:
+            self.controller.disconnect_callbacks.remove(self._on_disconnect)
+        self.controller.connection = None
+        await self.controller.disconnect()
+
+    async def wait_connected(self, timeout=None):
+        await asyncio.wait_for(self._connected.wait(), timeout)
+
+    def hold(self, uuid, payload):
+        ## Keep the latest payload per characteristic until the link is back
+        self._held[uuid] = bytes(payload)
+        self.held_writes += 1
+
+    def uptime(self):
+        ## Total seconds the link has been up while managed
+        if self._up_since is not None:
+            return self._uptime + time.monotonic() - self._up_since
+        return self._uptime
+
+    def stats(self):
+        latencies = self.reconnect_latencies
+        return {
+            "connected": self.connected,
+            "uptime": self.uptime(),
+            "drops": self.drops,
+            "reconnects": self.reconnects,
+            "attempts": self.attempts,
+            "held_writes": self.held_writes,
+            "last_reconnect_latency": self.last_reconnect_latency,
+            "mean_reconnect_latency": sum(latencies) / len(latencies) if latencies else None,
+            "max_reconnect_latency": max(latencies) if latencies else None,
+        }
+
+    def backoff(self, attempt):
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return delay * (1 - self.jitter * random.random())
+
+    def _mark_down(self):
+        self._connected.clear()
+        if self._up_since is not None:
+            self._uptime += time.monotonic() - self._up_since
+            self._up_since = None
+
+    def _on_disconnect(self, controller):
+        ## Runs from bleak's disconnected callback on the event loop thread
+        if not self._running:
+            return
+        self.drops += 1
+        self._mark_down()
+        self._down_since = time.monotonic()
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self):
+        attempt = 0
+        while self._running:
+            self.attempts += 1
+            try:
+                connected = await self.controller.connect()
+            except Exception as e:
+                log.info("Reconnect to %s failed: %s", self.controller.address, e)
+                connected = False
+
+            if connected:
+                ## Still marked down, so writes made meanwhile are held and replace older held values
+                await self._replay()
+                if self.controller.client is not None and self.controller.client.is_connected:
+                    break
+            await asyncio.sleep(self.backoff(attempt))
+            attempt += 1
+        else:
+            return
+
+        now = time.monotonic()
+        if self.drops:
+            self.reconnects += 1
+            self.last_reconnect_latency = now - self._down_since
+            self.reconnect_latencies.append(self.last_reconnect_latency)
+        self._up_since = now
+        self._connected.set()
+
+    async def _replay(self):
+        ## Send what was written while the link was down, in order, latest value per characteristic
+        while self._held and self._running:
+            uuid = next(iter(self._held))
+            payload = self._held.pop(uuid)
+            try:
+                await self.controller._transmit(uuid, payload)
+            except Exception as e:
+                client = self.controller.client
+                if client is None or not client.is_connected:
+                    ## Lost the link again, keep it for the next attempt unless something newer is held
+                    self._held.setdefault(uuid, payload)
+                    return
+                log.warning("Replaying held write to %s failed: %s", self.controller.address, e)
@@ -5,27 +5,134 @@
 #include <stdbool.h>
 #include <stdint.h>
 
-bool within_gamut(XYPoint *point) {
-    size_t denominator = ((GREEN_Y - BLUE_Y) * (RED_X - BLUE_X) + (BLUE_X - GREEN_X) * (RED_Y - BLUE_X));
-    size_t lambda1 = ((GREEN_Y - BLUE_Y) * (point->x - BLUE_X) + (BLUE_X - GREEN_X) * (point->y - BLUE_Y)) / denominator;
-    size_t lambda2 = ((BLUE_Y - RED_Y) * (point->x - BLUE_X) + (RED_X - BLUE_X) * (point->y - BLUE_Y)) / denominator;
-    size_t lambda3 = 1 - lambda1 - lambda2;
+const char *MAC = "C7:46:23:94:4A:14";
+const char *POWER_UUID = "932c32bd-0002-47a2-835a-a8d455b859dd";
+const char *BRIGHTNESS_UUID = "932c32bd-0003-47a2-835a-a8d455b859dd";
+const char *TEMP_UUID = "932c32bd-0004-47a2-835a-a8d455b859dd";
+const char *COLOR_UUID = "932c32bd-0005-47a2-835a-a8d455b859dd";
+
+const Gamut GAMUT_C = {RED_X, RED_Y, GREEN_X, GREEN_Y, BLUE_X, BLUE_Y};
+
+// Everything the gamut test and clamp need, computed once per gamut
+typedef struct {
+    double x3, y3;
+    double a1, b1, a2, b2;
+    double inv_denominator;
+    // Edges red-green, green-blue, blue-red
+    double ax[3], ay[3], abx[3], aby[3], inv_length2[3];
+} PreparedGamut;
+
+static void prepare_gamut(const Gamut *gamut, PreparedGamut *p) {
+    if (gamut == NULL) {
+        gamut = &GAMUT_C;
+    }
+
+    double x1 = gamut->red_x, y1 = gamut->red_y;
+    double x2 = gamut->green_x, y2 = gamut->green_y;
+    double x3 = gamut->blue_x, y3 = gamut->blue_y;
+    double denominator = (y2 - y3) * (x1 - x3) + (x3 - x2) * (y1 - y3);
+
+    p->x3 = x3;
+    p->y3 = y3;
+    p->a1 = y2 - y3;
+    p->b1 = x3 - x2;
+    p->a2 = y3 - y1;
+    p->b2 = x1 - x3;
+    p->inv_denominator = 1.0 / denominator;
+
+    double vx[4] = {x1, x2, x3, x1};
+    double vy[4] = {y1, y2, y3, y1};
+    for (int i = 0; i < 3; i++) {
+        p->ax[i] = vx[i];
+        p->ay[i] = vy[i];
+        p->abx[i] = vx[i + 1] - vx[i];
+        p->aby[i] = vy[i + 1] - vy[i];
+        p->inv_length2[i] = 1.0 / (p->abx[i] * p->abx[i] + p->aby[i] * p->aby[i]);
+    }
+}
+
+static void barycentric(const PreparedGamut *p, double x, double y, double *l1, double *l2, double *l3) {
+    double dx = x - p->x3;
+    double dy = y - p->y3;
+    *l1 = (p->a1 * dx + p->b1 * dy) * p->inv_denominator;
+    *l2 = (p->a2 * dx + p->b2 * dy) * p->inv_denominator;
+    *l3 = 1 - *l1 - *l2;
+}
+
+static void project(const PreparedGamut *p, int edge, double x, double y, double *px, double *py) {
+    double t = ((x - p->ax[edge]) * p->abx[edge] + (y - p->ay[edge]) * p->aby[edge]) * p->inv_length2[edge];
+    if (t < 0) {
+        t = 0.0;
+    } else if (t > 1) {
+        t = 1.0;
+    }
 
-    return (0 <= lambda1 <= 1) && (0 <= lambda2 <= 1) && (0 <=lambda3 <= 1);
+    *px = p->ax[edge] + t * p->abx[edge];
+    *py = p->ay[edge] + t * p->aby[edge];
 }
 
-size_t euclidean_distance(XYPoint *a, XYPoint *b) {
-    return sqrt(pow((a->x - b->x), 2) + pow((a->y - b->y), 2));
+static void nearer(const PreparedGamut *p, int first, int second, double x, double y, double *cx, double *cy) {
+    double ax, ay, bx, by;
+    project(p, first, x, y, &ax, &ay);
+    project(p, second, x, y, &bx, &by);
+
+    if ((x - ax) * (x - ax) + (y - ay) * (y - ay) <= (x - bx) * (x - bx) + (y - by) * (y - by)) {
+        *cx = ax;
+        *cy = ay;
+    } else {
+        *cx = bx;
+        *cy = by;
+    }
 }
 
-XYPoint point_to_segment(XYPoint *point, XYPoint *a, XYPoint *b) {
-    size_t dx1 = b->x - a->x;
-    size_t dy1 = b->y - a->y;
+// Same region logic as gamut.GamutProfile.clamp
+static void clamp_prepared(const PreparedGamut *p, double x, double y, double *cx, double *cy) {
+    double l1, l2, l3;
+    barycentric(p, x, y, &l1, &l2, &l3);
+
+    if (l1 < 0) {
+        if (l2 < 0) {
+            nearer(p, 1, 2, x, y, cx, cy);
+        } else if (l3 < 0) {
+            nearer(p, 0, 1, x, y, cx, cy);
+        } else {
+            project(p, 1, x, y, cx, cy);
+        }
+    } else if (l2 < 0) {
+        if (l3 < 0) {
+            nearer(p, 0, 2, x, y, cx, cy);
+        } else {
+            project(p, 2, x, y, cx, cy);
+        }
+    } else if (l3 < 0) {
+        project(p, 0, x, y, cx, cy);
+    } else {
+        *cx = x;
+        *cy = y;
+    }
+}
 
-    size_t dx2 = point->x - a->x;
-    size_t dy2 = point->y - a->y;
+bool within_gamut(const XYPoint *point, const Gamut *gamut) {
+    PreparedGamut p;
+    prepare_gamut(gamut, &p);
 
-    size_t t = (dx2 * dx1 + dy2 * dy1) / (dx1 * dx1 + dy1 * dy1); 
+    double l1, l2, l3;
+    barycentric(&p, point->x, point->y, &l1, &l2, &l3);
+    return l1 >= 0 && l2 >= 0 && l3 >= 0;
+}
+
+double euclidean_distance(const XYPoint *a, const XYPoint *b) {
+    return sqrt((a->x - b->x) * (a->x - b->x) + (a->y - b->y) * (a->y - b->y));
+}
+
+XYPoint point_to_segment(const XYPoint *point, const XYPoint *a, const XYPoint *b) {
+    double dx1 = b->x - a->x;
+    double dy1 = b->y - a->y;
+
+    double dx2 = point->x - a->x;
+    double dy2 = point->y - a->y;
+
+    double t = (dx2 * dx1 + dy2 * dy1) / (dx1 * dx1 + dy1 * dy1);
     if (t > 1) {
         t = 1;
     }
@@ -36,116 +143,100 @@ XYPoint point_to_segment(XYPoint *point, XYPoint *a, XYPoint *b) {
 
     XYPoint p = {
         a->x + t * dx1,
-        a->y + t * dy1
+        a->y + t * dy1,
+        point->brightness
     };
 
     return p;
 }
 
-XYPoint point_in_triangle(XYPoint *point) {
-    XYPoint x1 = {
-        RED_X,
-        RED_Y,
-        point->brightness
-    };
+// Closest point on the triangle's edges, also for points inside it
+XYPoint point_in_triangle(const XYPoint *point, const Gamut *gamut) {
+    PreparedGamut p;
+    prepare_gamut(gamut, &p);
+
+    XYPoint best = {point->x, point->y, point->brightness};
+    double best_distance = INFINITY;
+    for (int edge = 0; edge < 3; edge++) {
+        double px, py;
+        project(&p, edge, point->x, point->y, &px, &py);
+
+        double distance = (point->x - px) * (point->x - px) + (point->y - py) * (point->y - py);
+        if (distance < best_distance) {
+            best.x = px;
+            best.y = py;
+            best_distance = distance;
+        }
+    }
 
-    XYPoint x2 = {
-        GREEN_X,
-        GREEN_Y,
-        point->brightness
-    };
+    return best;
+}
 
-    XYPoint x3 = {
-        BLUE_X,
-        BLUE_Y,
-        point->brightness
-    };
+XYPoint gamut_clamp(const XYPoint *point, const Gamut *gamut) {
+    PreparedGamut p;
+    prepare_gamut(gamut, &p);
 
-    XYPoint closest1 = point_to_segment(point, &x1, &x2);
-    XYPoint closest2 = point_to_segment(point, &x2, &x3);
-    XYPoint closest3 = point_to_segment(point, &x3, &x1);
+    XYPoint clamped = {0, 0, point->brightness};
+    clamp_prepared(&p, point->x, point->y, &clamped.x, &clamped.y);
+    return clamped;
+}
 
-    size_t d1 = euclidean_distance(point, &closest1);
-    size_t d2 = euclidean_distance(point, &closest2);
-    size_t d3 = euclidean_distance(point, &closest3);
+static double gamma_lut[256];
+static bool gamma_ready = false;
 
-    if (d1 < d2 && d1 < d3) {
-        return closest1;
-    } else if (d2 < d1 && d2 < d3) {
-        return closest2;
+static void prepare_gamma(void) {
+    if (gamma_ready) {
+        return;
     }
-    
-    return closest3;
+
+    for (int i = 0; i < 256; i++) {
+        double c = i / 255.0;
+        gamma_lut[i] = (c <= 0.04045) ? (c / 12.92) : pow(((c + 0.055) / (1.0 + 0.055)), 2.4);
+    }
+    gamma_ready = true;
 }
 
-XYPoint rgb_to_xy(size_t r, size_t g, size_t b) {
-    double r_norm = r / 255;
-    double g_norm = g / 255;
-    double b_norm = b / 255;
+static void convert(const PreparedGamut *p, uint8_t r, uint8_t g, uint8_t b, double *out_x, double *out_y, double *out_brightness) {
+    double r_norm = gamma_lut[r];
+    double g_norm = gamma_lut[g];
+    double b_norm = gamma_lut[b];
 
-    r_norm = (r_norm <= 0.04045) ? (r_norm / 12.92) : pow(((r_norm + 0.055) / (1.0 + 0.055)), 2.4);
-    g_norm = (g_norm <= 0.04045) ? (g_norm / 12.92) : pow(((g_norm + 0.055) / (1.0 + 0.055)), 2.4);
-    b_norm = (b_norm <= 0.04045) ? (b_norm / 12.92) : pw(((b_norm + 0.055) / (1.0 + 0.055)), 2.4);
-o
     double x = r_norm * 0.4124 + g_norm * 0.3576 + b_norm * 0.1805;
     double y = r_norm * 0.2126 + g_norm * 0.7152 + b_norm * 0.0722;
     double z = r_norm * 0.0193 + g_norm * 0.1192 + b_norm * 0.9505;
 
-    double brightness = y;
+    // Black (0,0,0) has no chromaticity, clamp from the origin like the Python code
     double x_chroma = 0;
     double y_chroma = 0;
-    XYPoint p = {
-        x_chroma,
-        y_chroma,
-        brightness
-    };
-
-    if ((x + y + z) == 0) {
-        return p;
-    } else {
-        p.x = x / (x + y + z);
-        p.y = y / (x + y + z);
-    }
-
-    if (!within_gamut(&p)) {
-        p = point_in_triangle(&p);
+    if ((x + y + z) != 0) {
+        x_chroma = x / (x + y + z);
+        y_chroma = y / (x + y + z);
     }
 
-    return p;
-}
-
-HueController* controller_create(const char *address) {
-    
-}
-
-bool connect(HueController *controller) {
-
-}
-
-void disconnect(HueController *controller) {
-
-}
-
-bool power_on(HueController *controller) {
-
-}
-
-bool power_off(HueController *controller) {
-
+    clamp_prepared(p, x_chroma, y_chroma, out_x, out_y);
+    *out_brightness = y;
 }
 
-bool set_brightness(HueController *controller, double brightness) {
+XYPoint rgb_to_xy(uint8_t r, uint8_t g, uint8_t b, const Gamut *gamut) {
+    PreparedGamut p;
+    prepare_gamut(gamut, &p);
+    prepare_gamma();
 
+    XYPoint point;
+    convert(&p, r, g, b, &point.x, &point.y, &point.brightness);
+    return point;
 }
 
-bool set_colors_xy(HueController *controller, double x, double y) {
-
-}
-
-bool set_colors_rgb(HueController *controller, size_t r, size_t g, size_t b) {
-
+void rgb_to_xy_batch(const uint8_t *rgb, size_t count, const Gamut *gamut, double *xy, double *brightness) {
+    PreparedGamut p;
+    prepare_gamut(gamut, &p);
+    prepare_gamma();
+
+    for (size_t i = 0; i < count; i++) {
+        double level;
+        convert(&p, rgb[3 * i], rgb[3 * i + 1], rgb[3 * i + 2], &xy[2 * i], &xy[2 * i + 1], &level);
+        if (brightness != NULL) {
+            brightness[i] = level;
+        }
+    }
 }
-
-void discover_devices() {
-
-}
\ No newline at end of file
@@ -6,7 +6,7 @@
 #include <stdint.h>
 
 // https://developers.meethue.com/develop/application-design-guidance/color-conversion-formulas-rgb-to-xy-and-back/#Gamut
-// Gamut C
+// Gamut C, used whenever a NULL gamut is passed
 #define RED_X 0.6915
 #define RED_Y 0.3038
 #define GREEN_X 0.17
@@ -20,28 +20,28 @@
 #define GREEN_X 0.409
 #define GREEN_Y 0.518
 #define BLUE_X 0.167
-#define BLUE__Y 0.04
+#define BLUE_Y 0.04
 // Gamut A
 #define RED_X 0.704
 #define RED_Y 0.296
 #define GREEN_X 0.2151
 #define GREEN_Y 0.7106
 #define BLUE_X 0.138
-#define BLUE__Y 0.08
+#define BLUE_Y 0.08
 // Alt
 #define RED_X 1.0
 #define RED_Y 0.0
 #define GREEN_X 0.0
 #define GREEN_Y 1.0
 #define BLUE_X 0.0
-#define BLUE__Y 0.0
+#define BLUE_Y 0.0
 */
 
-const char *MAC;
-const char *POWER_UUID;
-const char *BRIGHTNESS_UUID;
-const char *TEMP_UUID;
-const char *COLOR_UUID;
+extern const char *MAC;
+extern const char *POWER_UUID;
+extern const char *BRIGHTNESS_UUID;
+extern const char *TEMP_UUID;
+extern const char *COLOR_UUID;
 
 typedef struct {
     double x;
@@ -49,26 +49,30 @@ typedef struct {
     double brightness;
 } XYPoint;
 
+// Triangle vertices, same layout as gamut.GamutProfile in Python
 typedef struct {
-    char *address;
-    void *client;
-} HueController;
+    double red_x;
+    double red_y;
+    double green_x;
+    double green_y;
+    double blue_x;
+    double blue_y;
+} Gamut;
 
-bool within_gamut(XYPoint *point);
-double euclidean_distance(XYPoint *a, XYPoint *b);
-XYPoint point_to_segment(XYPoint *point, XYPoint *a, XYPoint *b);
-XYPoint point_in_triangle(XYPoint *point);
-XYPoint rgb_to_xy(size_t r, size_t g, size_t b);
+extern const Gamut GAMUT_C;
 
-HueController* controller_create(const char *address);
-bool connect(HueController *controller);
-void disconnect(HueController *controller);
-bool power_on(HueController *controller);
-bool power_off(HueController *controller);
-bool set_brightness(HueController *controller, double brightness);
-bool set_colors_xy(HueController *controller, double x, double y);
-bool set_colors_rgb(HueController *controller, size_t r, size_t g, size_t b);
+// Every function taking a gamut falls back to GAMUT_C when it is NULL.
+// Results match cue.rgb_to_xy / gamut.GamutProfile bit for bit, so this
+// must be built without -ffast-math and with -ffp-contract=off.
+bool within_gamut(const XYPoint *point, const Gamut *gamut);
+double euclidean_distance(const XYPoint *a, const XYPoint *b);
+XYPoint point_to_segment(const XYPoint *point, const XYPoint *a, const XYPoint *b);
+XYPoint point_in_triangle(const XYPoint *point, const Gamut *gamut);
+XYPoint gamut_clamp(const XYPoint *point, const Gamut *gamut);
+XYPoint rgb_to_xy(uint8_t r, uint8_t g, uint8_t b, const Gamut *gamut);
 
-void discover_devices();
+// Array in, array out: rgb holds count packed r, g, b triples, xy receives
+// count x, y pairs and brightness (may be NULL) count values
+void rgb_to_xy_batch(const uint8_t *rgb, size_t count, const Gamut *gamut, double *xy, double *brightness);
 
-#endif // CUE_H
\ No newline at end of file
+#endif // CUE_H
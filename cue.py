@@ -1,18 +1,42 @@
 import math
+import os
+import time
 import asyncio
+import logging
 from bleak import BleakClient, BleakScanner
 
+import native
+from codec import POWER_OFF, POWER_ON, encode_brightness, encode_hsv, encode_temperature, encode_xy
+from gamut import GAMUT_C
+from scheduler import WriteScheduler
+from streaming import StreamWriter
+
+try:
+    import numpy as np
+except ImportError:
+    ## numpy is only needed for the batch conversion API
+    np = None
+
+## libcue built from cue.c, None when it isn't available
+_native = native.load()
+
+## Connection events, quiet unless the application configures logging
+log = logging.getLogger("cue")
+
 ## Device information
 MAC = "C7:46:23:94:4A:14"
 POWER_UUID = "932c32bd-0002-47a2-835a-a8d455b859dd"
 BRIGHTNESS_UUID = "932c32bd-0003-47a2-835a-a8d455b859dd"
 TEMP_UUID = "932c32bd-0004-47a2-835a-a8d455b859dd"
 COLOR_UUID = "932c32bd-0005-47a2-835a-a8d455b859dd"
+## Characteristic order used by the shadow and by the scene and trace file formats
+CHARACTERISTICS = (POWER_UUID, BRIGHTNESS_UUID, TEMP_UUID, COLOR_UUID)
 
 ## Color Gamut C triangle vertices for Philips Hue (newer models)
-RED = {"x": 0.6915, "y": 0.3038}
-GREEN = {"x": 0.17, "y": 0.7}
-BLUE = {"x": 0.1532, "y": 0.0475}
+## Other gamuts are GamutProfiles in gamut.py, controllers carry their own
+RED = {"x": GAMUT_C.red[0], "y": GAMUT_C.red[1]}
+GREEN = {"x": GAMUT_C.green[0], "y": GAMUT_C.green[1]}
+BLUE = {"x": GAMUT_C.blue[0], "y": GAMUT_C.blue[1]}
 
 class XyPoint:
     def __init__(self, x, y, brightness=None):
@@ -20,19 +44,8 @@ class XyPoint:
         self.y = y
         self.brightness = brightness
     
-    def within_gamut(self):
-        x, y = self.x, self.y
-        x1, y1 = RED["x"], RED["y"]
-        x2, y2 = GREEN["x"], GREEN["y"]
-        x3, y3 = BLUE["x"], BLUE["y"]
-        
-        denominator = (y2 - y3) * (x1 - x3) + (x3 - x2) * (y1 - y3)
-        
-        lambda1 = ((y2 - y3) * (x - x3) + (x3 - x2) * (y - y3)) / denominator
-        lambda2 = ((y3 - y1) * (x - x3) + (x1 - x3) * (y - y3)) / denominator
-        lambda3 = 1 - lambda1 - lambda2
-        
-        return (0 <= lambda1 <= 1) and (0 <= lambda2 <= 1) and (0 <= lambda3 <= 1)
+    def within_gamut(self, gamut=GAMUT_C):
+        return gamut.contains(self.x, self.y)
     
     def euclidean_distance(self, other):
         return math.sqrt((self.x - other.x) ** 2 + (self.y - other.y) ** 2)
@@ -49,40 +62,34 @@ class XyPoint:
         
         return XyPoint(a.x + t * ab_x, a.y + t * ab_y)
     
-    def point_in_triangle(self):
+    def point_in_triangle(self, gamut=GAMUT_C):
         ## If a value doesn't fall within the color gamut capable of the bulb
         ## We need to find the closest point in the gamut triangle
-        x1 = XyPoint(RED["x"], RED["y"])
-        x2 = XyPoint(GREEN["x"], GREEN["y"])
-        x3 = XyPoint(BLUE["x"], BLUE["y"])
-        
-        p1_closest = self.point_to_segment(x1, x2)
-        p2_closest = self.point_to_segment(x2, x3)
-        p3_closest = self.point_to_segment(x3, x1)
-        
-        d1 = self.euclidean_distance(p1_closest)
-        d2 = self.euclidean_distance(p2_closest)
-        d3 = self.euclidean_distance(p3_closest)
-        
-        if d1 < d2 and d1 < d3:
-            return p1_closest
-        elif d2 < d1 and d2 < d3:
-            return p2_closest
-        else:
-            return p3_closest
+        x, y = gamut.closest_on_edges(self.x, self.y)
+        return XyPoint(x, y, self.brightness)
+
+def _gamma_correct(c):
+    ## Normalize to 0-1 and apply gamma correction from hue documentation
+    c = c / 255
+    return (c / 12.92) if c <= 0.04045 else ((c + 0.055) / (1.0 + 0.055)) ** 2.4
+
+## Gamma curve for every 8-bit channel value, so the ** 2.4 only runs at import
+GAMMA_LUT = tuple(_gamma_correct(c) for c in range(256))
+
+
+def _gamma(c):
+    if c.__class__ is int and 0 <= c <= 255:
+        return GAMMA_LUT[c]
+    return _gamma_correct(c)
+
 
 ## https://developers.meethue.com/develop/application-design-guidance/color-conversion-formulas-rgb-to-xy-and-back/#Gamut
-def rgb_to_xy(r, g, b):
+def rgb_to_xy(r, g, b, gamut=GAMUT_C):
     ## All of this is pretty much from the devloper documentation
-    ## Normalize RGB values to 0-1
-    r = r / 255
-    g = g / 255
-    b = b / 255
-    
-    ## Apply gamma correction from hue documentation
-    r = (r / 12.92) if r <= 0.04045 else ((r + 0.055) / (1.0 + 0.055)) ** 2.4
-    g = (g / 12.92) if g <= 0.04045 else ((g + 0.055) / (1.0 + 0.055)) ** 2.4
-    b = (b / 12.92) if b <= 0.04045 else ((b + 0.055) / (1.0 + 0.055)) ** 2.4
+    ## Normalize and gamma correct, through GAMMA_LUT for 8-bit values
+    r = _gamma(r)
+    g = _gamma(g)
+    b = _gamma(b)
     
     ## Convert to XYZ with formula from hue documentation
     x = r * 0.4124 + g * 0.3576 + b * 0.1805
@@ -99,71 +106,320 @@ def rgb_to_xy(r, g, b):
         x_chroma = 0
         y_chroma = 0
     
-    xy = XyPoint(x_chroma, y_chroma, brightness)
-    
     ## Ensure the point is within the color gamut
-    if not xy.within_gamut():
-        xy = xy.point_in_triangle()
+    x_chroma, y_chroma = gamut.clamp(x_chroma, y_chroma)
     
+    return XyPoint(x_chroma, y_chroma, brightness), brightness
+
+
+def rgb_to_xy_batch(rgb, gamut=GAMUT_C):
+    """
+    Vectorized rgb_to_xy for an (N, 3) uint8 array of pixels.
+    Returns an (N, 2) float64 array of gamut-clamped xy and an (N,) brightness array.
+    """
+    if np is None:
+        raise ImportError("rgb_to_xy_batch requires numpy")
+
+    rgb = np.asarray(rgb)
+    if rgb.ndim != 2 or rgb.shape[1] != 3:
+        raise ValueError(f"expected an (N, 3) array, got shape {rgb.shape}")
+    if rgb.dtype != np.uint8:
+        raise TypeError(f"expected a uint8 array, got {rgb.dtype}")
+
+    if _native is not None:
+        return _native.rgb_to_xy_batch(rgb, gamut, np)
+
+    ## Gamma correction through the lookup table
+    linear = np.asarray(GAMMA_LUT, dtype=np.float64)[rgb]
+    r, g, b = linear[:, 0], linear[:, 1], linear[:, 2]
+
+    x = r * 0.4124 + g * 0.3576 + b * 0.1805
+    y = r * 0.2126 + g * 0.7152 + b * 0.0722
+    z = r * 0.0193 + g * 0.1192 + b * 0.9505
+
+    brightness = y
+    total = x + y + z
+    black = total == 0
+    safe_total = np.where(black, 1.0, total)
+    px = np.where(black, 0.0, x / safe_total)
+    py = np.where(black, 0.0, y / safe_total)
+
+    px, py = gamut.clamp_batch(px, py, np)
+
+    xy = np.empty((len(px), 2), dtype=np.float64)
+    xy[:, 0] = px
+    xy[:, 1] = py
     return xy, brightness
 
 
+def cache_dir():
+    ## Where on-disk caches (packet tables, known devices) live
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "cue")
+
+
 class HueBleController:
-    def __init__(self, address):
+    def __init__(self, address, packet_table=None, gamut=GAMUT_C, client_factory=BleakClient, adapter=None):
         self.address = address
         self.client = None
+        ## Bluetooth adapter to connect through (bleak's adapter=, e.g. "hci1"), None for the default
+        self.adapter = adapter
+        ## Builds the transport, anything shaped like BleakClient(address, disconnected_callback=...)
+        ## e.g. simulator.SimulatedNetwork.client_factory
+        self.client_factory = client_factory
+        ## Color gamut of this bulb model, see gamut.py
+        self.gamut = gamut
+        ## Optional packet_table.PacketTable mapping RGB straight to COLOR_UUID payloads
+        if packet_table is not None and packet_table.gamut != gamut:
+            raise ValueError(f"packet table is for gamut {packet_table.gamut.name}, bulb uses {gamut.name}")
+        self.packet_table = packet_table
+        ## Optional scheduler.WriteScheduler, see enable_scheduler
+        self.scheduler = None
+        ## Optional streaming.StreamWriter, see enable_streaming
+        self.stream = None
+        ## Optional connection.ConnectionManager, holds writes while the link is down
+        self.connection = None
+        ## Called with the controller whenever the link drops
+        self.disconnect_callbacks = []
+        ## Set while move_to_adapter swaps clients, that disconnect isn't a drop
+        self._moving = False
+        ## True from disconnect() until the next connect(), the link is down on purpose
+        self.closed = False
+        ## Optional shadow.BulbShadow, see enable_shadow
+        self.shadow = None
+        ## Optional perceptual.ChangeFilter, see enable_change_filter
+        self.change_filter = None
+        ## Optional instrumentation.Instrumentation, commands are not timed without one
+        self.instrumentation = None
+        ## Optional tracelog.TraceRecorder, logs every write asked of write_payload
+        self.recorder = None
     
     async def connect(self):
-        print(f"Connecting to {self.address}...")
-        self.client = BleakClient(self.address)
+        log.info("Connecting to %s...", self.address)
+        self.closed = False
+        if self.client is None:
+            ## Reused across reconnects, bleak clients can connect again after a drop
+            if self.adapter is None:
+                self.client = self.client_factory(self.address, disconnected_callback=self._handle_disconnect)
+            else:
+                self.client = self.client_factory(self.address, disconnected_callback=self._handle_disconnect,
+                                                  adapter=self.adapter)
         await self.client.connect()
 
         if self.client.is_connected:
-            print(f"Connected to {self.address}")
+            log.info("Connected to %s", self.address)
+            if self.shadow is not None:
+                await self.shadow.attach(self.client)
+            if self.scheduler is not None:
+                ## disconnect() stopped it
+                self.scheduler.start()
             return True
         else:
-            print(f"Failed to connect to {self.address}")
+            log.info("Failed to connect to %s", self.address)
             return False
     
     async def disconnect(self):
-        if self.client and self.client.is_connected:
-            await self.client.disconnect()
-            print(f"Disconnected from {self.address}")
+        if self.connection is not None:
+            ## Managed link, stopping the manager comes back here to disconnect
+            await self.connection.stop()
+            return
+        ## bleak still calls disconnected_callback, the callbacks are for link drops
+        self.closed = True
+        try:
+            if self.scheduler is not None:
+                await self.scheduler.stop()
+            if self.stream is not None:
+                if self.client is not None and self.client.is_connected:
+                    await self.stream.verify()
+                await self.stream.stop()
+        finally:
+            if self.client and self.client.is_connected:
+                await self.client.disconnect()
+                log.info("Disconnected from %s", self.address)
+    
+    async def move_to_adapter(self, adapter):
+        ## Reconnect through another adapter, a bleak client is bound to the one it was made for
+        reconnect = self.client is not None and self.client.is_connected
+        ## bleak reports our own disconnect too, it isn't a link drop
+        self._moving = True
+        try:
+            if reconnect:
+                await self.client.disconnect()
+            self.client = None
+            self.adapter = adapter
+            if reconnect:
+                return await self.connect()
+            return False
+        finally:
+            self._moving = False
+
+    def _handle_disconnect(self, client):
+        if self._moving or self.closed:
+            return
+        for callback in self.disconnect_callbacks:
+            callback(self)
+    
+    def enable_scheduler(self, max_rate=20.0):
+        ## Coalesce writes per characteristic, latest value wins
+        ## Must be called from within the running event loop
+        if self.scheduler is None:
+            self.scheduler = WriteScheduler(self, max_rate)
+        self.scheduler.start()
+        return self.scheduler
+    
+    async def flush(self):
+        ## Wait until every coalesced write has reached the bulb
+        if self.change_filter is not None:
+            await self.change_filter.flush()
+        if self.scheduler is not None:
+            await self.scheduler.flush()
+        if self.stream is not None:
+            await self.stream.verify()
+
+    @property
+    def write_mode(self):
+        return "reliable" if self.stream is None else "stream"
+
+    def enable_streaming(self, max_rate=50.0, burst=4, verify_every=50, verify_interval=1.0):
+        ## Write without response for high rate streams, see streaming.py
+        if self.stream is None:
+            self.stream = StreamWriter(self, max_rate, burst, verify_every, verify_interval)
+        return self.stream
+
+    async def disable_streaming(self):
+        ## Back to acknowledged writes, once the streamed state is confirmed
+        if self.stream is not None:
+            if self.client is not None and self.client.is_connected:
+                await self.stream.verify()
+            await self.stream.stop()
+            self.stream = None
+    
+    async def enable_shadow(self):
+        ## Track bulb state and skip writes that would not change it
+        ## Imported here, shadow.py needs the UUIDs from this module
+        from shadow import BulbShadow
+
+        if self.shadow is None:
+            self.shadow = BulbShadow()
+            if self.client is not None and self.client.is_connected:
+                await self.shadow.attach(self.client)
+        return self.shadow
+    
+    def enable_change_filter(self, xy_threshold=0.004, lightness_threshold=1.0, max_staleness=1.0):
+        ## Drop color and brightness updates too small to see, see perceptual.py
+        ## Imported here, perceptual.py needs the UUIDs from this module
+        from perceptual import ChangeFilter
+
+        if self.change_filter is None:
+            self.change_filter = ChangeFilter(self, xy_threshold, lightness_threshold, max_staleness)
+        return self.change_filter
+
+    async def write_payload(self, uuid, payload):
+        ## Write an encoded payload (see codec.py) to a characteristic, every command goes through here
+        ## Recorded, checked against the shadow and coalesced by the scheduler like the set_* methods
+        if self.recorder is not None:
+            self.recorder.record(self.address, uuid, payload)
+        if self.shadow is not None:
+            if self.shadow.matches(uuid, payload):
+                self.shadow.suppressed += 1
+                return
+            self.shadow.update(uuid, payload)
+        if self.scheduler is not None:
+            self.scheduler.submit(uuid, payload)
+            return
+        await self._send(uuid, payload)
+    
+    async def _send(self, uuid, payload):
+        if self.connection is not None and not self.connection.connected:
+            self.connection.hold(uuid, payload)
+            return
+        await self._transmit(uuid, payload)
+    
+    async def _transmit(self, uuid, payload):
+        ## The actual radio write
+        instrumentation = self.instrumentation
+        if instrumentation is not None:
+            start = time.perf_counter()
+        try:
+            if self.stream is not None:
+                await self.stream.send(uuid, payload)
+            else:
+                await self.client.write_gatt_char(uuid, payload)
+        except Exception:
+            ## The bulb may or may not have applied it
+            if self.shadow is not None:
+                self.shadow.invalidate(uuid)
+            if self.change_filter is not None:
+                self.change_filter.forget(uuid)
+            raise
+        finally:
+            if instrumentation is not None:
+                instrumentation.record(self.address, uuid, "write", time.perf_counter() - start)
     
     async def power_on(self):
-        await self.client.write_gatt_char(POWER_UUID, bytearray([0x01]))
-        print("Light turned on")
+        if self.instrumentation is not None:
+            self.instrumentation.command(self.address, "power_on")
+        await self.write_payload(POWER_UUID, POWER_ON)
     
     async def power_off(self):
-        await self.client.write_gatt_char(POWER_UUID, bytearray([0x00]))
-        print("Light turned off")
+        if self.instrumentation is not None:
+            self.instrumentation.command(self.address, "power_off")
+        await self.write_payload(POWER_UUID, POWER_OFF)
     
     async def set_brightness(self, brightness_percent):
-        brightness_value = int(min(max(brightness_percent, 0), 100) * 255 / 100)
-        await self.client.write_gatt_char(BRIGHTNESS_UUID, bytearray([brightness_value]))
-        print(f"Brightness set to {brightness_percent}%")
+        if self.instrumentation is not None:
+            self.instrumentation.command(self.address, "set_brightness", brightness_percent)
+        payload = encode_brightness(brightness_percent)
+        if self.change_filter is not None and not self.change_filter.admit(BRIGHTNESS_UUID, payload):
+            return
+        await self.write_payload(BRIGHTNESS_UUID, payload)
+    
+    async def set_temperature(self, mireds):
+        ## codec.kelvin_to_mireds converts from kelvin
+        if self.instrumentation is not None:
+            self.instrumentation.command(self.address, "set_temperature", mireds)
+        await self.write_payload(TEMP_UUID, encode_temperature(mireds))
     
     async def set_colors_xy(self, x, y):
-        ## Hue angle - https://stackoverflow.com/questions/22564187/rgb-to-philips-hue-hsb
-        scale_factor = 65535
-        scaled_x = int(x * scale_factor)
-        scaled_y = int(y * scale_factor)
-        
-        ## Create buffer for XY values (4 bytes: 2 for x, 2 for y)
-        buffer = bytearray(4)
-        buffer[0] = scaled_x & 0xFF
-        buffer[1] = (scaled_x >> 8) & 0xFF
-        buffer[2] = scaled_y & 0xFF
-        buffer[3] = (scaled_y >> 8) & 0xFF
-        
-        ## print(f"Setting XY color: ({x:.4f}, {y:.4f}) -> scaled: ({scaled_x}, {scaled_y})")
-        await self.client.write_gatt_char(COLOR_UUID, buffer)
+        if self.instrumentation is not None:
+            self.instrumentation.command(self.address, "set_colors_xy", (x, y))
+        payload = encode_xy(x, y)
+        if self.change_filter is not None and not self.change_filter.admit(COLOR_UUID, payload):
+            return
+        await self.write_payload(COLOR_UUID, payload)
+    
+    async def set_color_hsv(self, hue, saturation):
+        ## Layout found in huetesting.py, hue: 0-360, saturation: 0-1
+        if self.instrumentation is not None:
+            self.instrumentation.command(self.address, "set_color_hsv", (hue, saturation))
+        if self.change_filter is not None:
+            ## Not an xy payload, the next xy update has nothing to compare with
+            self.change_filter.forget(COLOR_UUID)
+        await self.write_payload(COLOR_UUID, encode_hsv(hue, saturation))
     
     async def set_colors_rgb(self, r, g, b):
-        print(f"Setting RGB color: ({r}, {g}, {b})")
-        xy, brightness = rgb_to_xy(r, g, b)
-        
-        await self.set_colors_xy(xy.x, xy.y)
+        instrumentation = self.instrumentation
+        if instrumentation is not None:
+            instrumentation.command(self.address, "set_colors_rgb", (r, g, b))
+            start = time.perf_counter()
+
+        payload = None
+        if self.packet_table is not None:
+            ## Precomputed payload, skips the conversion entirely
+            try:
+                payload = self.packet_table.lookup(r, g, b)
+            except (TypeError, ValueError):
+                ## Not 8-bit integers, the table doesn't cover it
+                pass
+        if payload is None:
+            xy, brightness = rgb_to_xy(r, g, b, self.gamut)
+            payload = encode_xy(xy.x, xy.y)
+
+        if instrumentation is not None:
+            instrumentation.record(self.address, COLOR_UUID, "convert", time.perf_counter() - start)
+        if self.change_filter is not None and not self.change_filter.admit(COLOR_UUID, payload):
+            return
+        await self.write_payload(COLOR_UUID, payload)
 
 
 async def discover_devices():
@@ -211,4 +467,5 @@ async def main():
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,93 @@
+"""
+    Command line client for the cue daemon
+
+    Sends one command to daemon.py over its Unix socket and prints the
+    reply. It deliberately imports nothing but the standard library basics
+    (no bleak, no asyncio), so a command returns in milliseconds against
+    links the daemon already holds open.
+
+        cuectl.py off
+        cuectl.py -b C7:46:23:94:4A:14 rgb 255 0 0
+        cuectl.py brightness 40
+        cuectl.py status
+
+    Protocol, one line each way: an optional "@ADDRESS,ADDRESS" target
+    followed by the command and its arguments, answered by "ok ..." or
+    "error ...".
+"""
+
+import _socket
+import os
+import sys
+
+USAGE = "usage: cuectl.py [-s SOCKET] [-b ADDRESS]... COMMAND [ARGS...]"
+
+
+def default_socket_path():
+    ## Shared with daemon.py, which imports it from here
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "cue.sock")
+    return f"/tmp/cue-{os.getuid()}.sock"
+
+
+def format_request(command, args=(), addresses=()):
+    target = f"@{','.join(addresses)} " if addresses else ""
+    return f"{target}{' '.join([command, *map(str, args)])}\n"
+
+
+def send(line, path=None, timeout=30.0):
+    ## Raw reply line for a request line
+    sock = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(path or os.environ.get("CUE_SOCKET") or default_socket_path())
+        sock.sendall(line.encode())
+        reply = b""
+        while not reply.endswith(b"\n"):
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            reply += chunk
+    finally:
+        sock.close()
+    return reply.decode().rstrip("\n")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    path = None
+    addresses = []
+    while argv and argv[0] in ("-s", "--socket", "-b", "--bulb"):
+        if len(argv) < 2:
+            print(USAGE, file=sys.stderr)
+            return 2
+        if argv[0] in ("-s", "--socket"):
+            path = argv[1]
+        else:
+            addresses.append(argv[1])
+        argv = argv[2:]
+    if not argv or argv[0] in ("-h", "--help"):
+        print(USAGE, file=sys.stderr)
+        return 2
+
+    try:
+        reply = send(format_request(argv[0], argv[1:], addresses), path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print("cue daemon is not running", file=sys.stderr)
+        return 3
+    except OSError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 3
+
+    status, _, message = reply.partition(" ")
+    if status != "ok":
+        print(message or reply, file=sys.stderr)
+        return 1
+    if message:
+        print(message)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
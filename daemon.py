@@ -0,0 +1,245 @@
+"""
+    Long-running cue daemon
+
+    Running a script per command pays for Python startup, importing bleak,
+    connecting and tearing the link down again, so a one-off "lights off"
+    takes seconds. The daemon instead keeps every configured bulb connected
+    (a ConnectionManager per bulb reconnects after drops, holding writes in
+    the meantime) and takes commands from cuectl.py over a Unix socket:
+
+        python daemon.py -b C7:46:23:94:4A:14 -b ...
+        python cuectl.py off
+
+    Bulbs default to the ones remembered in discovery.DeviceCache. The
+    protocol is one text line per request, see cuectl.py; `status` answers
+    with JSON. --simulate runs against simulator.py bulbs instead of BLE.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import time
+
+from connection import ConnectionManager
+from cue import HueBleController
+from cuectl import default_socket_path
+from fleet import HueFleet
+
+
+def _byte(value):
+    value = int(value)
+    if not 0 <= value <= 255:
+        raise ValueError(f"{value} is not in 0-255")
+    return value
+
+
+## name -> (argument parsers, command(controller, *args))
+COMMANDS = {
+    "on": ((), lambda controller: controller.power_on()),
+    "off": ((), lambda controller: controller.power_off()),
+    "brightness": ((float,), lambda controller, percent: controller.set_brightness(percent)),
+    "temp": ((int,), lambda controller, mireds: controller.set_temperature(mireds)),
+    "xy": ((float, float), lambda controller, x, y: controller.set_colors_xy(x, y)),
+    "rgb": ((_byte, _byte, _byte), lambda controller, r, g, b: controller.set_colors_rgb(r, g, b)),
+    "hsv": ((float, float), lambda controller, hue, saturation: controller.set_color_hsv(hue, saturation)),
+}
+
+
+class CueDaemon:
+    def __init__(self, addresses, socket_path=None, controller_factory=HueBleController, shadow=True):
+        self.socket_path = socket_path or default_socket_path()
+        self.fleet = HueFleet([address.upper() for address in addresses], controller_factory=controller_factory)
+        self.shadow = shadow
+        self.managers = {}
+        self._connecting = []
+        self._server = None
+        ## Handler task -> its writer, for every connected client
+        self._clients = {}
+        self._stopped = asyncio.Event()
+        self.started = None
+        self.requests = 0
+
+    async def start(self):
+        for address, controller in self.fleet.controllers.items():
+            if self.shadow:
+                ## Repeated commands ("on" twice) cost nothing, status reads from it
+                await controller.enable_shadow()
+            manager = self.managers[address] = ConnectionManager(controller)
+            ## Don't wait for the links, writes are held until they are up
+            self._connecting.append(asyncio.get_running_loop().create_task(manager.start()))
+
+        self._remove_stale_socket()
+        self._server = await asyncio.start_unix_server(self._handle, self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        self.started = time.monotonic()
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            try:
+                os.unlink(self.socket_path)
+            except FileNotFoundError:
+                pass
+
+        ## Hang up on clients, their handlers see EOF and finish before the loop goes away
+        for writer in self._clients.values():
+            writer.close()
+        await asyncio.gather(*self._clients, return_exceptions=True)
+
+        for task in self._connecting:
+            task.cancel()
+        await asyncio.gather(*self._connecting, return_exceptions=True)
+        self._connecting.clear()
+        await asyncio.gather(*(manager.stop() for manager in self.managers.values()), return_exceptions=True)
+        await self.fleet.disconnect()
+
+    def shutdown(self):
+        self._stopped.set()
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"Listening on {self.socket_path} for {len(self.fleet.controllers)} bulb(s)")
+        try:
+            await self._stopped.wait()
+        finally:
+            await self.stop()
+
+    def status(self):
+        bulbs = {}
+        for address, controller in self.fleet.controllers.items():
+            manager = self.managers.get(address)
+            bulbs[address] = {
+                "connection": manager.stats() if manager is not None else None,
+                "state": controller.shadow.snapshot() if controller.shadow is not None else None,
+            }
+        return {
+            "uptime": time.monotonic() - self.started if self.started is not None else 0.0,
+            "requests": self.requests,
+            "bulbs": bulbs,
+        }
+
+    async def execute(self, line):
+        ## One request line -> one reply line
+        self.requests += 1
+        words = line.split()
+        addresses = None
+        if words and words[0].startswith("@"):
+            addresses = [address.upper() for address in words.pop(0)[1:].split(",") if address]
+            unknown = [address for address in addresses if address not in self.fleet.controllers]
+            if unknown:
+                return f"error unknown bulb {', '.join(unknown)}"
+        if not words:
+            return "error empty command"
+
+        name, args = words[0].lower(), words[1:]
+        if name == "ping":
+            return "ok pong"
+        if name == "status":
+            return f"ok {json.dumps(self.status())}"
+        if name == "shutdown":
+            self.shutdown()
+            return "ok"
+
+        if name not in COMMANDS:
+            return f"error unknown command {name!r}, expected one of {', '.join(COMMANDS)}, status, ping, shutdown"
+        parsers, command = COMMANDS[name]
+        if len(args) != len(parsers):
+            return f"error {name} takes {len(parsers)} argument(s), got {len(args)}"
+        try:
+            values = [parse(arg) for parse, arg in zip(parsers, args)]
+        except ValueError as e:
+            return f"error bad argument for {name}: {e}"
+
+        start = time.perf_counter()
+        ## Bulbs that are down get the write held by their ConnectionManager
+        results = await self.fleet.run(lambda controller: command(controller, *values), addresses,
+                                       require_connection=False)
+        elapsed = (time.perf_counter() - start) * 1000
+
+        failed = [result for result in results if not result.ok]
+        if failed:
+            details = "; ".join(f"{result.address}: {result.error}" for result in failed)
+            return f"error {len(failed)}/{len(results)} failed: {details}"
+        held = sum(1 for result in results if not self.managers[result.address].connected)
+        suffix = f", {held} held until reconnect" if held else ""
+        return f"ok {len(results)} bulb(s) in {elapsed:.1f}ms{suffix}"
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._clients[task] = writer
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                reply = await self.execute(line.decode(errors="replace"))
+                writer.write(reply.encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            del self._clients[task]
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    def _remove_stale_socket(self):
+        ## A socket file left behind by a daemon that didn't exit cleanly
+        if not os.path.exists(self.socket_path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except ConnectionRefusedError:
+            os.unlink(self.socket_path)
+        else:
+            raise RuntimeError(f"a cue daemon is already listening on {self.socket_path}")
+        finally:
+            probe.close()
+
+
+async def run(addresses, socket_path=None, controller_factory=HueBleController):
+    daemon = CueDaemon(addresses, socket_path, controller_factory)
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, daemon.shutdown)
+    await daemon.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep Hue bulbs connected and take commands over a Unix socket")
+    parser.add_argument("-b", "--bulb", action="append", default=[], help="bulb address, repeatable")
+    parser.add_argument("-s", "--socket", help=f"socket path (default {default_socket_path()})")
+    parser.add_argument("--simulate", action="store_true", help="use simulated bulbs instead of BLE")
+    args = parser.parse_args(argv)
+    ## Connects, drops and reconnects end up in the daemon's log
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+
+    addresses = args.bulb
+    if not addresses:
+        from discovery import DeviceCache
+
+        addresses = [bulb.address for bulb in DeviceCache().known()]
+    if not addresses:
+        parser.error("no bulbs given and none remembered by discovery, pass --bulb")
+
+    controller_factory = HueBleController
+    if args.simulate:
+        from simulator import SimulatedNetwork
+
+        network = SimulatedNetwork(latency=0.005)
+        controller_factory = lambda address: HueBleController(address, client_factory=network.client_factory)
+
+    asyncio.run(run(addresses, args.socket, controller_factory))
+
+
+if __name__ == "__main__":
+    main()
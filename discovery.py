@@ -0,0 +1,146 @@
+"""
+    Fast Hue bulb discovery
+
+    scan_hue streams bulbs as they are seen instead of waiting for a full
+    BleakScanner.discover() run, only keeps devices advertising a Hue service
+    (932c32bd-...) or one of the requested addresses, and stops as soon as all
+    requested addresses have been found.
+
+    Every bulb seen is remembered in an on-disk DeviceCache with its last RSSI,
+    so find_bulbs can hand back known addresses straight away on restart and
+    only scans for the ones it hasn't seen before.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from bleak import BleakScanner
+
+from cue import cache_dir
+
+HUE_SERVICE_PREFIX = "932c32bd-"
+
+
+class KnownBulb:
+    __slots__ = ("address", "name", "rssi", "last_seen", "cached")
+
+    def __init__(self, address, name=None, rssi=None, last_seen=None, cached=False):
+        self.address = address
+        self.name = name
+        self.rssi = rssi
+        self.last_seen = last_seen
+        ## True when the entry came from the cache rather than a scan
+        self.cached = cached
+
+    def __repr__(self):
+        source = "cached" if self.cached else "scanned"
+        return f"KnownBulb({self.address}, {self.name!r}, rssi={self.rssi}, {source})"
+
+
+class DeviceCache:
+    def __init__(self, path=None):
+        self.path = path or os.path.join(cache_dir(), "devices.json")
+        self._entries = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                self._entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self._entries = {}
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".devices-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self._entries, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def update(self, address, name=None, rssi=None):
+        address = address.upper()
+        self._entries[address] = {"name": name, "rssi": rssi, "last_seen": time.time()}
+
+    def get(self, address, max_age=None):
+        entry = self._entries.get(address.upper())
+        if entry is None:
+            return None
+        if max_age is not None and time.time() - entry["last_seen"] > max_age:
+            return None
+        return KnownBulb(address.upper(), entry["name"], entry["rssi"], entry["last_seen"], cached=True)
+
+    def known(self, max_age=None):
+        bulbs = (self.get(address, max_age) for address in self._entries)
+        return [bulb for bulb in bulbs if bulb is not None]
+
+    def forget(self, address):
+        self._entries.pop(address.upper(), None)
+
+
+def is_hue(advertisement_data):
+    return any(uuid.lower().startswith(HUE_SERVICE_PREFIX) for uuid in advertisement_data.service_uuids)
+
+
+async def scan_hue(addresses=None, timeout=10.0, cache=None):
+    ## Async iterator of KnownBulb, ends on timeout or once every address was found
+    wanted = {address.upper() for address in addresses} if addresses else None
+    seen = set()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+
+    async with BleakScanner() as scanner:
+        stream = scanner.advertisement_data()
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    device, advertisement_data = await asyncio.wait_for(stream.__anext__(), remaining)
+                except (asyncio.TimeoutError, StopAsyncIteration):
+                    break
+
+                address = device.address.upper()
+                if address in seen:
+                    continue
+                if wanted is not None:
+                    if address not in wanted:
+                        continue
+                elif not is_hue(advertisement_data):
+                    continue
+
+                seen.add(address)
+                if cache is not None:
+                    cache.update(address, device.name, advertisement_data.rssi)
+                yield KnownBulb(address, device.name, advertisement_data.rssi, time.time())
+
+                if wanted is not None and wanted <= seen:
+                    break
+        finally:
+            await stream.aclose()
+            if cache is not None and seen:
+                cache.save()
+
+
+async def find_bulbs(addresses, timeout=10.0, cache=None, max_age=None):
+    ## Cached addresses come back immediately, only misses are scanned for
+    cache = cache if cache is not None else DeviceCache()
+    found = {}
+    for address in addresses:
+        bulb = cache.get(address, max_age)
+        if bulb is not None:
+            found[bulb.address] = bulb
+
+    misses = [address for address in addresses if address.upper() not in found]
+    if misses:
+        async for bulb in scan_hue(misses, timeout, cache):
+            found[bulb.address] = bulb
+    return found
@@ -0,0 +1,209 @@
+"""
+    Rotary encoder input
+
+    The goal from huetesting.py: turn a knob, move around the hue circle.
+    An encoder produces ticks far faster than a GATT link takes writes, so
+    EncoderInput folds every tick into a position straight away but keeps at
+    most one write in flight per bulb. Ticks arriving during a write are
+    coalesced into the next one, never queued and never lost, so the bulb
+    always catches up to where the knob is now. A failed write is retried
+    with the latest position, up to max_retries times in a row.
+
+    Positions map to payloads through a PayloadTable computed up front
+    (hue_table for HSV or gamut-clamped xy, brightness_table for dimming),
+    so the input path does no color math. Latency from the oldest event
+    folded into a write to that write completing is recorded in a histogram
+    and checked against latency_budget.
+
+    Sources are async iterators of (perf_counter timestamp, value), like the
+    frame sources in ambient.py: evdev_events reads a Linux input device (or
+    a recording of one), replay_events plays back a list for tests.
+"""
+
+import asyncio
+import colorsys
+import struct
+import time
+
+from codec import encode_brightness, encode_hsv, encode_xy
+from cue import BRIGHTNESS_UUID, COLOR_UUID, rgb_to_xy
+from gamut import GAMUT_C
+from instrumentation import Histogram
+
+## struct input_event from linux/input.h: timeval, type, code, value
+_INPUT_EVENT = struct.Struct("llHHi")
+EV_REL = 0x02
+EV_ABS = 0x03
+REL_DIAL = 0x07
+REL_WHEEL = 0x08
+
+
+async def evdev_events(path, types=(EV_REL, EV_ABS), codes=None, live=True):
+    ## /dev/input/eventN or a file of raw input_event records
+    ## live: shift timestamps back to when the kernel saw the event
+    loop = asyncio.get_running_loop()
+    size = _INPUT_EVENT.size
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            ## Blocks until the device has events, so off the loop thread
+            data = await loop.run_in_executor(None, f.read, size * 64)
+            if not data:
+                return
+            received = time.perf_counter()
+            now = time.time()
+            for offset in range(0, len(data) - size + 1, size):
+                seconds, microseconds, event_type, code, value = _INPUT_EVENT.unpack_from(data, offset)
+                if event_type not in types or (codes is not None and code not in codes):
+                    continue
+                if live:
+                    yield received - max(0.0, now - (seconds + microseconds / 1e6)), value
+                else:
+                    yield received, value
+
+
+async def replay_events(events, realtime=True):
+    ## (seconds from start, value) pairs, paced on the event loop clock unless realtime is False
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for offset, value in events:
+        if realtime:
+            await asyncio.sleep(max(0.0, start + offset - loop.time()))
+        else:
+            await asyncio.sleep(0)
+        yield time.perf_counter(), value
+
+
+class PayloadTable:
+    def __init__(self, uuid, payloads, span=360.0, wrap=True):
+        ## payloads[i] covers positions [i * span / len, (i + 1) * span / len)
+        self.uuid = uuid
+        self.payloads = tuple(payloads)
+        self.span = span
+        ## Wrap around (hue circle) or stop at the ends (brightness)
+        self.wrap = wrap
+        self._scale = len(self.payloads) / span
+
+    def normalize(self, position):
+        if self.wrap:
+            return position % self.span
+        return min(max(position, 0.0), self.span)
+
+    def lookup(self, position):
+        index = int(self.normalize(position) * self._scale)
+        return self.payloads[min(index, len(self.payloads) - 1)]
+
+
+def hue_table(steps=360, mode="hsv", saturation=1.0, gamut=GAMUT_C):
+    ## Angle in degrees -> COLOR_UUID payload
+    ## mode "hsv": the firmware's HSV layout, "xy": hue wheel color clamped into the gamut
+    angles = [index * 360 / steps for index in range(steps)]
+    if mode == "hsv":
+        payloads = [encode_hsv(angle, saturation) for angle in angles]
+    elif mode == "xy":
+        payloads = []
+        for angle in angles:
+            r, g, b = colorsys.hsv_to_rgb(angle / 360, saturation, 1.0)
+            xy, _ = rgb_to_xy(round(r * 255), round(g * 255), round(b * 255), gamut)
+            payloads.append(encode_xy(xy.x, xy.y))
+    else:
+        raise ValueError(f"unknown mode {mode!r}, expected 'hsv' or 'xy'")
+    return PayloadTable(COLOR_UUID, payloads, 360.0, wrap=True)
+
+
+def brightness_table(steps=101):
+    ## Percent -> BRIGHTNESS_UUID payload
+    return PayloadTable(BRIGHTNESS_UUID, [encode_brightness(index * 100 / (steps - 1)) for index in range(steps)],
+                        100.0, wrap=False)
+
+
+class EncoderInput:
+    def __init__(self, controller, source, table=None, units_per_step=5.0, relative=True,
+                 position=0.0, latency_budget=0.05, on_over_budget=None, max_retries=3):
+        self.controller = controller
+        self.source = source
+        self.table = table if table is not None else hue_table(gamut=controller.gamut)
+        ## Table units (degrees for hue_table) per tick, or per unit of an absolute value
+        self.units_per_step = units_per_step
+        ## Relative events (REL_DIAL ticks) add up, absolute ones (EV_ABS) set the position
+        self.relative = relative
+        self.position = self.table.normalize(position)
+        self.latency_budget = latency_budget
+        ## Called with the latency in seconds of every write over budget
+        self.on_over_budget = on_over_budget
+        ## Failed writes in a row before waiting for the next event to try again
+        self.max_retries = max_retries
+
+        ## perf_counter of the oldest event not yet in a write, None when caught up
+        self._oldest = None
+        self._writer = None
+
+        self.events = 0
+        self.writes = 0
+        self.errors = 0
+        self.over_budget = 0
+        self.last_error = None
+        self.latency = Histogram()
+
+    def feed(self, captured, value):
+        ## One input event, must be called on the event loop
+        if self.relative:
+            self.position = self.table.normalize(self.position + value * self.units_per_step)
+        else:
+            self.position = self.table.normalize(value * self.units_per_step)
+        self.events += 1
+        if self._oldest is None:
+            self._oldest = captured
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.get_running_loop().create_task(self._drain())
+
+    async def _drain(self):
+        ## Write the current position until no event is left unwritten
+        failures = 0
+        while self._oldest is not None:
+            captured, self._oldest = self._oldest, None
+            try:
+                await self.controller.write_payload(self.table.uuid, self.table.lookup(self.position))
+            except Exception as e:
+                self.errors += 1
+                self.last_error = e
+                failures += 1
+                if failures <= self.max_retries:
+                    ## The bulb still hasn't seen these events, try again with the latest position
+                    self._oldest = captured if self._oldest is None else min(captured, self._oldest)
+                continue
+            failures = 0
+            latency = time.perf_counter() - captured
+            self.writes += 1
+            self.latency.record(latency)
+            if latency > self.latency_budget:
+                self.over_budget += 1
+                if self.on_over_budget is not None:
+                    self.on_over_budget(latency)
+
+    async def run(self):
+        try:
+            async for captured, value in self.source:
+                self.feed(captured, value)
+        finally:
+            if self._writer is not None:
+                await asyncio.gather(self._writer, return_exceptions=True)
+        return self.stats()
+
+    @property
+    def coalesced(self):
+        return max(0, self.events - self.writes - self.errors)
+
+    def stats(self):
+        return {
+            "events": self.events,
+            "writes": self.writes,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "position": self.position,
+            "latency_mean": self.latency.mean,
+            ## Bucket bound, can't be worse than the slowest write
+            "latency_p99": min(self.latency.percentile(0.99), self.latency.max),
+            "latency_max": self.latency.max,
+            "latency_budget": self.latency_budget,
+            "over_budget": self.over_budget,
+        }
@@ -0,0 +1,131 @@
+"""
+    Driving many bulbs at once
+
+    HueFleet owns one HueBleController per address. Connections are opened
+    concurrently, bounded by max_concurrency so the adapter isn't asked for
+    dozens of simultaneous connects. Every bulb has its own command queue and
+    worker, so commands to one bulb stay ordered while a group operation fans
+    out to all bulbs in parallel. Group operations return one BulbResult per
+    bulb instead of failing the whole group when a single bulb misbehaves.
+"""
+
+import asyncio
+import time
+
+from cue import HueBleController
+
+
+class BulbResult:
+    __slots__ = ("address", "ok", "value", "error", "elapsed")
+
+    def __init__(self, address, ok, value=None, error=None, elapsed=0.0):
+        self.address = address
+        self.ok = ok
+        self.value = value
+        self.error = error
+        ## Seconds from the command being queued to it completing
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        status = "ok" if self.ok else f"error={self.error!r}"
+        return f"BulbResult({self.address}, {status}, {self.elapsed * 1000:.1f}ms)"
+
+
+class HueFleet:
+    def __init__(self, addresses, max_concurrency=8, controller_factory=HueBleController):
+        self.controllers = {address: controller_factory(address) for address in addresses}
+        self.max_concurrency = max_concurrency
+        self._connect_slots = asyncio.Semaphore(max_concurrency)
+        self._queues = {}
+        self._workers = {}
+
+    @property
+    def addresses(self):
+        return list(self.controllers)
+
+    def connected(self):
+        return [
+            address for address, controller in self.controllers.items()
+            if controller.client is not None and controller.client.is_connected
+        ]
+
+    async def connect(self):
+        self._start_workers()
+        return await self._gather(self._connect_one, self.controllers)
+
+    async def disconnect(self):
+        results = await self.run(lambda controller: controller.disconnect(), require_connection=False)
+        for worker in self._workers.values():
+            worker.cancel()
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+        self._workers.clear()
+        self._queues.clear()
+        return results
+
+    async def run(self, command, addresses=None, require_connection=True):
+        ## Queue command(controller) on every selected bulb and wait for all of them
+        self._start_workers()
+        addresses = self.controllers if addresses is None else addresses
+        loop = asyncio.get_running_loop()
+
+        pending = []
+        for address in addresses:
+            future = loop.create_future()
+            self._queues[address].put_nowait((command, require_connection, future, time.perf_counter()))
+            pending.append(future)
+        return list(await asyncio.gather(*pending))
+
+    async def power_on(self, addresses=None):
+        return await self.run(lambda controller: controller.power_on(), addresses)
+
+    async def power_off(self, addresses=None):
+        return await self.run(lambda controller: controller.power_off(), addresses)
+
+    async def set_brightness(self, brightness_percent, addresses=None):
+        return await self.run(lambda controller: controller.set_brightness(brightness_percent), addresses)
+
+    async def set_colors_rgb(self, r, g, b, addresses=None):
+        return await self.run(lambda controller: controller.set_colors_rgb(r, g, b), addresses)
+
+    async def set_colors_xy(self, x, y, addresses=None):
+        return await self.run(lambda controller: controller.set_colors_xy(x, y), addresses)
+
+    async def _connect_one(self, address):
+        async with self._connect_slots:
+            connected = await self.controllers[address].connect()
+        if not connected:
+            raise ConnectionError(f"Failed to connect to {address}")
+        return connected
+
+    async def _gather(self, func, addresses):
+        async def timed(address):
+            start = time.perf_counter()
+            try:
+                value = await func(address)
+            except Exception as e:
+                return BulbResult(address, False, error=e, elapsed=time.perf_counter() - start)
+            return BulbResult(address, True, value, elapsed=time.perf_counter() - start)
+
+        return list(await asyncio.gather(*(timed(address) for address in addresses)))
+
+    def _start_workers(self):
+        for address in self.controllers:
+            if address not in self._workers:
+                self._queues[address] = asyncio.Queue()
+                self._workers[address] = asyncio.get_running_loop().create_task(self._worker(address))
+
+    async def _worker(self, address):
+        controller = self.controllers[address]
+        queue = self._queues[address]
+        while True:
+            command, require_connection, future, queued_at = await queue.get()
+            try:
+                if require_connection and (controller.client is None or not controller.client.is_connected):
+                    raise ConnectionError(f"{address} is not connected")
+                value = await command(controller)
+            except Exception as e:
+                result = BulbResult(address, False, error=e, elapsed=time.perf_counter() - queued_at)
+            else:
+                result = BulbResult(address, True, value, elapsed=time.perf_counter() - queued_at)
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,167 @@
+"""
+    Hue color gamuts
+
+    A GamutProfile precomputes everything the gamut test and clamp need from
+    its triangle (barycentric coefficients, the inverse denominator, edge
+    vectors and their inverse squared lengths) once, when it is created.
+    clamp() then decides inside/outside and which edge or corner region the
+    point falls in from a single set of barycentric coordinates, and projects
+    onto at most two edges using squared distances, so there is no sqrt and no
+    allocation on the per-color path.
+
+    https://developers.meethue.com/develop/application-design-guidance/color-conversion-formulas-rgb-to-xy-and-back/#Gamut
+"""
+
+
+class GamutProfile:
+    __slots__ = (
+        "name", "red", "green", "blue",
+        "_x3", "_y3", "_a1", "_b1", "_a2", "_b2", "_inv_denominator", "_edges",
+    )
+
+    def __init__(self, name, red, green, blue):
+        self.name = name
+        self.red = tuple(red)
+        self.green = tuple(green)
+        self.blue = tuple(blue)
+
+        (x1, y1), (x2, y2), (x3, y3) = self.red, self.green, self.blue
+        denominator = (y2 - y3) * (x1 - x3) + (x3 - x2) * (y1 - y3)
+        if denominator == 0:
+            raise ValueError(f"gamut {name} is degenerate")
+
+        ## Barycentric coordinates relative to blue
+        self._x3, self._y3 = x3, y3
+        self._a1, self._b1 = y2 - y3, x3 - x2
+        self._a2, self._b2 = y3 - y1, x1 - x3
+        self._inv_denominator = 1.0 / denominator
+
+        ## Edges red-green, green-blue, blue-red as (ax, ay, abx, aby, 1 / |ab|^2)
+        edges = []
+        for (ax, ay), (bx, by) in ((self.red, self.green), (self.green, self.blue), (self.blue, self.red)):
+            abx, aby = bx - ax, by - ay
+            edges.append((ax, ay, abx, aby, 1.0 / (abx * abx + aby * aby)))
+        self._edges = tuple(edges)
+
+    def __repr__(self):
+        return f"GamutProfile({self.name!r}, red={self.red}, green={self.green}, blue={self.blue})"
+
+    def __eq__(self, other):
+        if not isinstance(other, GamutProfile):
+            return NotImplemented
+        return (self.red, self.green, self.blue) == (other.red, other.green, other.blue)
+
+    def __hash__(self):
+        return hash((self.red, self.green, self.blue))
+
+    @classmethod
+    def custom(cls, red, green, blue, name="custom"):
+        return cls(name, red, green, blue)
+
+    def barycentric(self, x, y):
+        dx = x - self._x3
+        dy = y - self._y3
+        lambda1 = (self._a1 * dx + self._b1 * dy) * self._inv_denominator
+        lambda2 = (self._a2 * dx + self._b2 * dy) * self._inv_denominator
+        return lambda1, lambda2, 1 - lambda1 - lambda2
+
+    def contains(self, x, y):
+        lambda1, lambda2, lambda3 = self.barycentric(x, y)
+        return lambda1 >= 0 and lambda2 >= 0 and lambda3 >= 0
+
+    def _project(self, edge, x, y):
+        ax, ay, abx, aby, inv_length2 = self._edges[edge]
+        t = ((x - ax) * abx + (y - ay) * aby) * inv_length2
+        if t < 0:
+            t = 0.0
+        elif t > 1:
+            t = 1.0
+        return ax + t * abx, ay + t * aby
+
+    def _nearer(self, first, second, x, y):
+        ## Closest of two edge projections, compared by squared distance
+        ax, ay = self._project(first, x, y)
+        bx, by = self._project(second, x, y)
+        if (x - ax) ** 2 + (y - ay) ** 2 <= (x - bx) ** 2 + (y - by) ** 2:
+            return ax, ay
+        return bx, by
+
+    def clamp(self, x, y):
+        ## Closest point of the gamut triangle to (x, y), the point itself when inside
+        lambda1, lambda2, lambda3 = self.barycentric(x, y)
+
+        ## A negative coordinate means the point is past the edge opposite that vertex
+        ## Edge 0 is opposite blue, edge 1 opposite red, edge 2 opposite green
+        if lambda1 < 0:
+            if lambda2 < 0:
+                return self._nearer(1, 2, x, y)
+            if lambda3 < 0:
+                return self._nearer(0, 1, x, y)
+            return self._project(1, x, y)
+        if lambda2 < 0:
+            if lambda3 < 0:
+                return self._nearer(0, 2, x, y)
+            return self._project(2, x, y)
+        if lambda3 < 0:
+            return self._project(0, x, y)
+        return x, y
+
+    def closest_on_edges(self, x, y):
+        ## Closest point on the triangle's boundary, also for points inside it
+        best = None
+        best_distance = None
+        for edge in range(3):
+            px, py = self._project(edge, x, y)
+            distance = (x - px) ** 2 + (y - py) ** 2
+            if best_distance is None or distance < best_distance:
+                best, best_distance = (px, py), distance
+        return best
+
+    def clamp_batch(self, x, y, np):
+        ## Vectorized clamp over float64 arrays, same math and tie breaking as clamp
+        dx = x - self._x3
+        dy = y - self._y3
+        lambda1 = (self._a1 * dx + self._b1 * dy) * self._inv_denominator
+        lambda2 = (self._a2 * dx + self._b2 * dy) * self._inv_denominator
+        lambda3 = 1 - lambda1 - lambda2
+        out1, out2, out3 = lambda1 < 0, lambda2 < 0, lambda3 < 0
+
+        cx = x.copy()
+        cy = y.copy()
+        outside = out1 | out2 | out3
+        if not outside.any():
+            return cx, cy
+
+        projections = []
+        for ax, ay, abx, aby, inv_length2 in self._edges:
+            t = np.clip(((x - ax) * abx + (y - ay) * aby) * inv_length2, 0.0, 1.0)
+            px = ax + t * abx
+            py = ay + t * aby
+            projections.append((px, py, (x - px) ** 2 + (y - py) ** 2))
+
+        def nearer(first, second):
+            ax, ay, da = projections[first]
+            bx, by, db = projections[second]
+            pick = da <= db
+            return np.where(pick, ax, bx), np.where(pick, ay, by)
+
+        ## Same region order as clamp, later assignments only touch their own region
+        regions = (
+            (out1 & ~out2 & ~out3, projections[1][:2]),
+            (out2 & ~out1 & ~out3, projections[2][:2]),
+            (out3 & ~out1 & ~out2, projections[0][:2]),
+            (out1 & out2, nearer(1, 2)),
+            (out1 & out3, nearer(0, 1)),
+            (out2 & out3, nearer(0, 2)),
+        )
+        for mask, (px, py) in regions:
+            cx[mask] = px[mask]
+            cy[mask] = py[mask]
+        return cx, cy
+
+
+GAMUT_A = GamutProfile("A", (0.704, 0.296), (0.2151, 0.7106), (0.138, 0.08))
+GAMUT_B = GamutProfile("B", (0.675, 0.322), (0.409, 0.518), (0.167, 0.04))
+GAMUT_C = GamutProfile("C", (0.6915, 0.3038), (0.17, 0.7), (0.1532, 0.0475))
+
+GAMUTS = {gamut.name: gamut for gamut in (GAMUT_A, GAMUT_B, GAMUT_C)}
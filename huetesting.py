@@ -26,32 +26,24 @@
 
 ## Device C7:46:23:94:4A:14 Hue color lamp 2
 import asyncio
-import math
 from bleak import BleakClient
 
+from codec import encode_flagged_xy, encode_hsv
+from gamut import GAMUT_B
+
 MAC = "C7:46:23:94:4A:14"
 POWER_UUID = "932c32bd-0002-47a2-835a-a8d455b859dd"
 BRIGHTNESS_UUID = "932c32bd-0003-47a2-835a-a8d455b859dd"
 TEMP_UUID = "932c32bd-0004-47a2-835a-a8d455b859dd"
 COLOR_UUID = "932c32bd-0005-47a2-835a-a8d455b859dd"
 
-"""
-G_RED = (0.6915, 0.3038)
-G_GREEN = (0.17, 0.7)
-G_BLUE = (0.1532, 0.0475)
-"""
-
-# Trying gamut b
-G_RED = (0.675, 0.322)
-G_GREEN = (0.409, 0.518)
-G_BLUE = (0.167, 0.04)
+# Trying gamut b, GAMUT_C is the one cue.py defaults to
+GAMUT = GAMUT_B
 
 async def set_color_hsv(hue: float, saturation: float, client):
     ## hue: 0-360, saturation: 0-1?
-    hue8 = int((hue / 360) * 254)
-    sat8 = int(saturation * 254)
-
-    cmd = bytes([0xfe, hue8, sat8, 0x00])
+    ## bytes([0xfe, hue8, sat8, 0x00]), see codec.encode_hsv
+    cmd = encode_hsv(hue, saturation)
     await client.write_gatt_char(COLOR_UUID, cmd, response=False)
 
 async def control_bulb(addr):
@@ -249,66 +241,16 @@ def rgb_xy(r: int, g: int, b: int):
     return x_final, y_final
 
 def adjust_xy_to_gamut(x: float, y: float):
-    p = (x, y)
-    a = G_RED
-    b = G_GREEN
-    c = G_BLUE
-    if point_in_triangle(p, a, b, c):
-        return p
-    else:
-        return closest_point_in_triangle(p, a, b, c)
+    return GAMUT.clamp(x, y)
 
 def build_color_packet(x: float, y: float):
     X, Y = adjust_xy_to_gamut(x, y)
-    scale_x = int(X * 0xFFFF)
-    scale_y = int(Y * 0xFFFF)
-
     set_bit = 254 # I've tried 0x01, 0xfe (254), idk
-    packet = bytes([set_bit]) + scale_x.to_bytes(2, byteorder='little') + scale_y.to_bytes(2, byteorder='little')
-    print(f"Adjusted xy: ({X:.3f}, {Y:.3f}), Scaled x: {scale_x}, Scaled y: {scale_y}, Packet: {packet}")
+    packet = encode_flagged_xy(X, Y, set_bit)
+    print(f"Adjusted xy: ({X:.3f}, {Y:.3f}), Packet: {packet}")
 
     return packet
 
-def point_in_triangle(p, a, b, c):
-    # Using barycentric coordinates to determine if p is inside triangle abc
-    (px, py), (ax, ay), (bx, by), (cx, cy) = p, a, b, c
-    v0 = (cx - ax, cy - ay)
-    v1 = (bx - ax, by - ay)
-    v2 = (px - ax, py - ay)
-
-    dot00 = v0[0]*v0[0] + v0[1]*v0[1]
-    dot01 = v0[0]*v1[0] + v0[1]*v1[1]
-    dot02 = v0[0]*v2[0] + v0[1]*v2[1]
-    dot11 = v1[0]*v1[0] + v1[1]*v1[1]
-    dot12 = v1[0]*v2[0] + v1[1]*v2[1]
-
-    invDenom = 1 / (dot00 * dot11 - dot01 * dot01) if (dot00 * dot11 - dot01 * dot01) != 0 else 0
-    u = (dot11 * dot02 - dot01 * dot12) * invDenom
-    v = (dot00 * dot12 - dot01 * dot02) * invDenom
-    return (u >= 0) and (v >= 0) and (u + v <= 1)
-
-def project_to_line(p, a, b):
-    # Projects point p onto line segment ab
-    (px, py), (ax, ay), (bx, by) = p, a, b
-    ab = (bx - ax, by - ay)
-    ab2 = ab[0]**2 + ab[1]**2
-    if ab2 == 0:
-        return a
-    t = ((px - ax) * ab[0] + (py - ay) * ab[1]) / ab2
-    t = max(0, min(1, t))
-    return (ax + t * ab[0], ay + t * ab[1])
-
-def closest_point_in_triangle(p, a, b, c):
-    # Project p onto each edge and return the one closest to p
-    p_ab = project_to_line(p, a, b)
-    p_bc = project_to_line(p, b, c)
-    p_ca = project_to_line(p, c, a)
-    d_ab = math.hypot(p[0]-p_ab[0], p[1]-p_ab[1])
-    d_bc = math.hypot(p[0]-p_bc[0], p[1]-p_bc[1])
-    d_ca = math.hypot(p[0]-p_ca[0], p[1]-p_ca[1])
-    distances = [(d_ab, p_ab), (d_bc, p_bc), (d_ca, p_ca)]
-    return min(distances, key=lambda x: x[0])[1]
-
 async def set_color_direct(client, cmd_bytes):
     """
     Set color using direct byte commands
@@ -0,0 +1,146 @@
+"""
+    Command latency instrumentation
+
+    Replaces the per-command print() calls in HueBleController. When a
+    controller has an Instrumentation attached it records how long each
+    command spent in three phases:
+
+        convert  RGB -> xy conversion and payload encoding
+        queue    waiting in the write scheduler
+        write    inside write_gatt_char
+
+    into fixed-bucket histograms keyed by bulb, characteristic and phase.
+    Nothing is formatted or printed on the hot path; hooks get the raw
+    samples and command events, and text_snapshot() / snapshot() export the
+    histograms on demand. A controller without instrumentation only pays for
+    an `is not None` check per command.
+"""
+
+import bisect
+
+from cue import BRIGHTNESS_UUID, COLOR_UUID, POWER_UUID, TEMP_UUID
+
+## Upper bounds in seconds, the last bucket catches everything slower
+BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+CHARACTERISTIC_NAMES = {
+    POWER_UUID: "power",
+    BRIGHTNESS_UUID: "brightness",
+    TEMP_UUID: "temperature",
+    COLOR_UUID: "color",
+}
+
+PHASES = ("convert", "queue", "write")
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "count", "total", "max")
+
+    def __init__(self, bounds=BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, fraction):
+        ## Upper bound of the bucket holding the given fraction of samples
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return self.bounds[index] if index < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "p50": self.percentile(0.5),
+            "p99": self.percentile(0.99),
+            "max": self.max,
+            "buckets": dict(zip([*map(str, self.bounds), "inf"], self.counts)),
+        }
+
+
+class Instrumentation:
+    def __init__(self, bounds=BUCKETS):
+        self.bounds = bounds
+        ## (address, characteristic, phase) -> Histogram
+        self.histograms = {}
+        ## hook(address, characteristic, phase, seconds) per sample
+        self.sample_hooks = []
+        ## hook(address, command, value) per controller command
+        self.command_hooks = []
+        self.commands = 0
+
+    def record(self, address, uuid, phase, seconds):
+        characteristic = CHARACTERISTIC_NAMES.get(uuid, uuid)
+        key = (address, characteristic, phase)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(self.bounds)
+        histogram.record(seconds)
+        for hook in self.sample_hooks:
+            hook(address, characteristic, phase, seconds)
+
+    def command(self, address, name, value=None):
+        self.commands += 1
+        for hook in self.command_hooks:
+            hook(address, name, value)
+
+    def add_sample_hook(self, hook):
+        self.sample_hooks.append(hook)
+
+    def add_command_hook(self, hook):
+        self.command_hooks.append(hook)
+
+    def merged(self, phase, characteristic=None):
+        ## One histogram over every bulb, optionally for a single characteristic
+        merged = Histogram(self.bounds)
+        for (_, name, key_phase), histogram in self.histograms.items():
+            if key_phase != phase or (characteristic is not None and name != characteristic):
+                continue
+            merged.count += histogram.count
+            merged.total += histogram.total
+            merged.max = max(merged.max, histogram.max)
+            merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+        return merged
+
+    def snapshot(self):
+        return {
+            f"{address}/{characteristic}/{phase}": histogram.snapshot()
+            for (address, characteristic, phase), histogram in sorted(self.histograms.items())
+        }
+
+    def text_snapshot(self):
+        lines = [f"{'bulb':20s} {'characteristic':12s} {'phase':8s} {'count':>8s} "
+                 f"{'mean ms':>9s} {'p50 ms':>9s} {'p99 ms':>9s} {'max ms':>9s}"]
+        for (address, characteristic, phase), h in sorted(self.histograms.items()):
+            lines.append(f"{address:20s} {characteristic:12s} {phase:8s} {h.count:8d} "
+                         f"{h.mean * 1000:9.3f} {h.percentile(0.5) * 1000:9.3f} "
+                         f"{h.percentile(0.99) * 1000:9.3f} {h.max * 1000:9.3f}")
+        return "\n".join(lines)
+
+    def reset(self):
+        self.histograms.clear()
+        self.commands = 0
+
+
+def print_commands(address, name, value=None):
+    ## Command hook bringing back the old console output
+    print(f"{address}: {name}" if value is None else f"{address}: {name} {value}")
@@ -0,0 +1,88 @@
+"""
+    Optional native accelerator
+
+    Loads libcue (built from cue.c with `make`) through ctypes. cue.py picks it
+    up automatically for rgb_to_xy_batch when the library sits next to it and
+    falls back to the numpy code when it doesn't. The scalar rgb_to_xy stays
+    in Python, one ctypes call costs about as much as the whole conversion.
+    Set CUE_NATIVE=0 to force the Python path, or CUE_NATIVE_LIB to load the
+    library from somewhere else.
+
+    The C code performs the same floating point operations in the same order
+    as cue.rgb_to_xy and gamut.GamutProfile, so results are identical,
+    test_native.py checks that across the RGB cube.
+"""
+
+import ctypes
+import os
+
+_LIBRARY_NAMES = ("libcue.so", "libcue.dylib", "cue.dll")
+
+
+class XYPoint(ctypes.Structure):
+    _fields_ = [("x", ctypes.c_double), ("y", ctypes.c_double), ("brightness", ctypes.c_double)]
+
+
+class Gamut(ctypes.Structure):
+    _fields_ = [
+        ("red_x", ctypes.c_double), ("red_y", ctypes.c_double),
+        ("green_x", ctypes.c_double), ("green_y", ctypes.c_double),
+        ("blue_x", ctypes.c_double), ("blue_y", ctypes.c_double),
+    ]
+
+
+class NativeLibrary:
+    def __init__(self, lib, path):
+        self.lib = lib
+        self.path = path
+        self._gamuts = {}
+
+        lib.rgb_to_xy.argtypes = [ctypes.c_uint8, ctypes.c_uint8, ctypes.c_uint8, ctypes.POINTER(Gamut)]
+        lib.rgb_to_xy.restype = XYPoint
+        lib.gamut_clamp.argtypes = [ctypes.POINTER(XYPoint), ctypes.POINTER(Gamut)]
+        lib.gamut_clamp.restype = XYPoint
+        lib.rgb_to_xy_batch.argtypes = [
+            ctypes.c_void_p, ctypes.c_size_t, ctypes.POINTER(Gamut), ctypes.c_void_p, ctypes.c_void_p,
+        ]
+        lib.rgb_to_xy_batch.restype = None
+        self._rgb_to_xy = lib.rgb_to_xy
+        self._rgb_to_xy_batch = lib.rgb_to_xy_batch
+
+    def gamut(self, profile):
+        ## ctypes copy of a GamutProfile, cached so the hot path doesn't rebuild it
+        native = self._gamuts.get(profile)
+        if native is None:
+            native = self._gamuts[profile] = ctypes.pointer(Gamut(*profile.red, *profile.green, *profile.blue))
+        return native
+
+    def rgb_to_xy(self, r, g, b, profile):
+        point = self._rgb_to_xy(r, g, b, self.gamut(profile))
+        return point.x, point.y, point.brightness
+
+    def rgb_to_xy_batch(self, rgb, profile, np):
+        rgb = np.ascontiguousarray(rgb)
+        count = len(rgb)
+        xy = np.empty((count, 2), dtype=np.float64)
+        brightness = np.empty(count, dtype=np.float64)
+        self._rgb_to_xy_batch(rgb.ctypes.data, count, self.gamut(profile), xy.ctypes.data, brightness.ctypes.data)
+        return xy, brightness
+
+
+def load():
+    ## NativeLibrary, or None when it is disabled or hasn't been built
+    if os.environ.get("CUE_NATIVE") == "0":
+        return None
+
+    path = os.environ.get("CUE_NATIVE_LIB")
+    candidates = [path] if path else [
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), name) for name in _LIBRARY_NAMES
+    ]
+    for candidate in candidates:
+        if not os.path.exists(candidate):
+            continue
+        try:
+            return NativeLibrary(ctypes.CDLL(candidate), candidate)
+        except (OSError, AttributeError):
+            ## Wrong architecture or an outdated build, use Python instead
+            continue
+    return None
@@ -0,0 +1,146 @@
+"""
+    Precomputed RGB -> COLOR_UUID payload table
+
+    Every quantized RGB value maps straight to the 4 byte xy payload that
+    HueBleController.set_colors_xy would send, so repeated colors skip the
+    gamma, matrix, gamut and packing work. The table is stored in a file and
+    memory-mapped read-only, so it opens instantly and the OS shares the pages
+    between every process that uses the same file.
+
+    bits=8 is the full 24-bit table (64 MiB), bits=6 is 1 MiB and is usually
+    indistinguishable on a bulb. Each table is built for one gamut profile.
+"""
+
+import mmap
+import operator
+import os
+import struct
+import tempfile
+
+from codec import encode_xy, encode_xy_batch
+from cue import cache_dir, np, rgb_to_xy, rgb_to_xy_batch
+from gamut import GAMUT_C
+
+PAYLOAD_SIZE = 4
+
+## File header: magic, bits per channel, padding, gamut red/green/blue xy
+_MAGIC = b"CUEPKT02"
+_HEADER = struct.Struct("<8sB7x6d")
+
+## Rows converted per rgb_to_xy_batch call while building
+_BUILD_CHUNK = 1 << 18
+
+
+def default_path(bits, gamut=GAMUT_C):
+    return os.path.join(cache_dir(), f"packets-{gamut.name}-{bits}bit.bin")
+
+
+def _levels(bits):
+    ## 8-bit value each quantized level stands for, spread evenly over 0-255
+    count = 1 << bits
+    return [(q * 255 + (count - 1) // 2) // (count - 1) for q in range(count)]
+
+
+def _build_payloads(bits, gamut):
+    count = 1 << bits
+    levels = _levels(bits)
+    entries = count ** 3
+
+    if np is None:
+        ## Pure Python fallback, fine for the smaller quantizations
+        out = bytearray(entries * PAYLOAD_SIZE)
+        offset = 0
+        for r in levels:
+            for g in levels:
+                for b in levels:
+                    xy, _ = rgb_to_xy(r, g, b, gamut)
+                    out[offset:offset + PAYLOAD_SIZE] = encode_xy(xy.x, xy.y)
+                    offset += PAYLOAD_SIZE
+        return out
+
+    levels = np.asarray(levels, dtype=np.uint8)
+    out = np.empty((entries, PAYLOAD_SIZE), dtype=np.uint8)
+    for start in range(0, entries, _BUILD_CHUNK):
+        index = np.arange(start, min(start + _BUILD_CHUNK, entries))
+        rgb = np.empty((len(index), 3), dtype=np.uint8)
+        rgb[:, 0] = levels[index >> (2 * bits)]
+        rgb[:, 1] = levels[(index >> bits) & (count - 1)]
+        rgb[:, 2] = levels[index & (count - 1)]
+        xy, _ = rgb_to_xy_batch(rgb, gamut)
+        out[start:start + len(index)] = encode_xy_batch(xy, np)
+    return out.tobytes()
+
+
+def build(path, bits=6, gamut=GAMUT_C):
+    ## Written to a temporary file and renamed, so readers never see a partial table
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".packets-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, bits, *gamut.red, *gamut.green, *gamut.blue))
+            f.write(_build_payloads(bits, gamut))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class PacketTable:
+    def __init__(self, path, bits, gamut=GAMUT_C):
+        self.path = path
+        self.bits = bits
+        self.gamut = gamut
+        self._shift = 8 - bits
+
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @classmethod
+    def open(cls, path=None, bits=6, gamut=GAMUT_C, rebuild=False):
+        ## Load the table at path, building it first if it is missing or stale
+        if not 1 <= bits <= 8:
+            raise ValueError(f"bits must be between 1 and 8, got {bits}")
+        path = path or default_path(bits, gamut)
+
+        if rebuild or not _is_valid(path, bits, gamut):
+            build(path, bits, gamut)
+        return cls(path, bits, gamut)
+
+    def index(self, r, g, b):
+        shift = self._shift
+        bits = self.bits
+        return ((r >> shift) << (2 * bits)) | ((g >> shift) << bits) | (b >> shift)
+
+    def lookup(self, r, g, b):
+        ## Payload bytes for 8-bit channels, sliced straight off the mapping so nothing pins it open
+        r, g, b = operator.index(r), operator.index(g), operator.index(b)
+        if not (0 <= r <= 255 and 0 <= g <= 255 and 0 <= b <= 255):
+            raise ValueError(f"rgb ({r}, {g}, {b}) is outside 0-255")
+        offset = _HEADER.size + self.index(r, g, b) * PAYLOAD_SIZE
+        return self._mm[offset:offset + PAYLOAD_SIZE]
+
+    def close(self):
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _is_valid(path, bits, gamut):
+    try:
+        with open(path, "rb") as f:
+            header = f.read(_HEADER.size)
+            size = os.fstat(f.fileno()).st_size
+    except FileNotFoundError:
+        return False
+
+    if len(header) != _HEADER.size:
+        return False
+    magic, file_bits, *vertices = _HEADER.unpack(header)
+    expected_size = _HEADER.size + (1 << (3 * bits)) * PAYLOAD_SIZE
+    return (magic == _MAGIC and file_bits == bits and size == expected_size
+            and tuple(vertices) == (*gamut.red, *gamut.green, *gamut.blue))
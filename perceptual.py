@@ -0,0 +1,142 @@
+"""
+    Perceptual change filter
+
+    Colors streamed from sensors or video change by amounts nobody can see
+    from one update to the next, yet each one costs a radio write.
+    ChangeFilter compares every new color and brightness with the value last
+    sent to the bulb and drops updates below a perceptual threshold:
+
+        color       distance in CIE xy, 0.004 is a few MacAdam ellipses
+        brightness  difference in CIE lightness L* (0-100), which follows
+                    perceived brightness rather than the raw level
+
+    A dropped update is not lost. Once max_staleness seconds have passed
+    since the last write the latest value is sent anyway, on the next update
+    or from a timer if the stream has gone quiet, so slow drifts still land.
+    Other characteristics pass through whenever they change.
+"""
+
+import asyncio
+import math
+import time
+
+from codec import decode_brightness, decode_xy
+from cue import BRIGHTNESS_UUID, COLOR_UUID
+
+
+def lightness(percent):
+    ## CIE L* for a relative luminance given in percent
+    y = percent / 100
+    if y <= 216 / 24389:
+        return y * 24389 / 27
+    return 116 * y ** (1 / 3) - 16
+
+
+class ChangeFilter:
+    def __init__(self, controller, xy_threshold=0.004, lightness_threshold=1.0, max_staleness=1.0):
+        self.controller = controller
+        self.xy_threshold = xy_threshold
+        self.lightness_threshold = lightness_threshold
+        self.max_staleness = max_staleness
+
+        ## uuid -> (payload, monotonic time) of the last value let through
+        self._sent = {}
+        ## uuid -> newest dropped payload that still differs from the sent one
+        self._pending = {}
+        self._timers = {}
+        self._tasks = set()
+
+        ## Counters
+        self.passed = 0
+        self.dropped = 0
+        self.landed = 0
+        self.errors = 0
+        self.last_error = None
+
+    def distance(self, uuid, old, new):
+        ## In units of the characteristic's threshold, >= 1 is visible
+        if uuid == COLOR_UUID:
+            (x1, y1), (x2, y2) = decode_xy(old), decode_xy(new)
+            return math.hypot(x2 - x1, y2 - y1) / self.xy_threshold
+        if uuid == BRIGHTNESS_UUID:
+            change = abs(lightness(decode_brightness(new)) - lightness(decode_brightness(old)))
+            return change / self.lightness_threshold
+        return 0.0 if old == new else math.inf
+
+    def admit(self, uuid, payload):
+        ## True when the payload should be written, False when it was dropped
+        now = time.monotonic()
+        last = self._sent.get(uuid)
+        if last is not None:
+            sent, sent_at = last
+            if sent == payload:
+                ## Back where the bulb already is, nothing left to land
+                self._cancel(uuid)
+                self.dropped += 1
+                return False
+            if self.distance(uuid, sent, payload) < 1 and now - sent_at < self.max_staleness:
+                self.dropped += 1
+                self._pending[uuid] = bytes(payload)
+                if uuid not in self._timers:
+                    self._timers[uuid] = asyncio.get_running_loop().call_later(
+                        sent_at + self.max_staleness - now, self._land, uuid)
+                return False
+        self._sent[uuid] = (bytes(payload), now)
+        self._cancel(uuid)
+        self.passed += 1
+        return True
+
+    def forget(self, uuid=None):
+        ## The bulb was changed some other way, compare against nothing
+        for key in ([uuid] if uuid is not None else list(self._sent)):
+            self._sent.pop(key, None)
+            self._cancel(key)
+
+    def _cancel(self, uuid):
+        self._pending.pop(uuid, None)
+        timer = self._timers.pop(uuid, None)
+        if timer is not None:
+            timer.cancel()
+
+    def _land(self, uuid):
+        self._timers.pop(uuid, None)
+        task = asyncio.get_running_loop().create_task(self._write_pending(uuid))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _write_pending(self, uuid):
+        payload = self._pending.pop(uuid, None)
+        if payload is None:
+            return
+        self._sent[uuid] = (payload, time.monotonic())
+        self.landed += 1
+        try:
+            await self.controller.write_payload(uuid, payload)
+        except Exception as e:
+            self.errors += 1
+            self.last_error = e
+
+    async def flush(self):
+        ## Send every dropped value that hasn't landed yet
+        for uuid in list(self._pending):
+            timer = self._timers.pop(uuid, None)
+            if timer is not None:
+                timer.cancel()
+            await self._write_pending(uuid)
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
+
+    @property
+    def saved(self):
+        ## Writes avoided, a landed value costs one of the drops back
+        return self.dropped - self.landed
+
+    def stats(self):
+        return {
+            "passed": self.passed,
+            "dropped": self.dropped,
+            "saved": self.saved,
+            "landed": self.landed,
+            "pending": len(self._pending),
+            "errors": self.errors,
+        }
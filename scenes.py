@@ -0,0 +1,211 @@
+"""
+    Precompiled scenes
+
+    A scene is the power, brightness and color of a set of bulbs.
+    compile_scene does all the conversion work once (RGB -> xy through each
+    bulb's gamut, brightness and temperature encoding) and keeps nothing but
+    the final payloads, which save() writes to a compact binary file, a few
+    bytes per characteristic.
+
+    apply_scene sends a scene to every bulb concurrently, starting all of
+    them at one deadline on the event loop clock instead of walking the
+    bulbs in turn, and reports how far each bulb landed from that deadline.
+
+    File layout, little endian: magic, name length + name, bulb count, then
+    per bulb address length + address, write count and per write the
+    characteristic index (see cue.CHARACTERISTICS) and payload length + payload.
+"""
+
+import asyncio
+import os
+import struct
+import tempfile
+
+from codec import POWER_OFF, POWER_ON, encode_brightness, encode_temperature, encode_xy
+from cue import BRIGHTNESS_UUID, CHARACTERISTICS, COLOR_UUID, POWER_UUID, TEMP_UUID, rgb_to_xy
+from gamut import GAMUT_C
+
+_MAGIC = b"CUESCN01"
+_COUNT = struct.Struct("<H")
+_BYTE = struct.Struct("<B")
+
+
+def _bulb_writes(settings, gamut):
+    ## Ordered so a bulb being switched on lights up in its new state
+    writes = []
+    if settings.get("power") is False:
+        return [(POWER_UUID, POWER_OFF)]
+    if "temperature" in settings:
+        writes.append((TEMP_UUID, encode_temperature(settings["temperature"])))
+    if "rgb" in settings:
+        xy, _ = rgb_to_xy(*settings["rgb"], gamut)
+        writes.append((COLOR_UUID, encode_xy(xy.x, xy.y)))
+    elif "xy" in settings:
+        x, y = gamut.clamp(*settings["xy"])
+        writes.append((COLOR_UUID, encode_xy(x, y)))
+    if "brightness" in settings:
+        writes.append((BRIGHTNESS_UUID, encode_brightness(settings["brightness"])))
+    if settings.get("power") is True:
+        writes.append((POWER_UUID, POWER_ON))
+    return writes
+
+
+def compile_scene(name, bulbs, gamuts=GAMUT_C):
+    ## bulbs: {address: {"power": bool, "rgb": (r, g, b) or "xy": (x, y), "brightness": percent,
+    ##                   "temperature": mireds}}, every key optional
+    ## gamuts: one GamutProfile for every bulb or {address: GamutProfile}
+    writes = {}
+    for address, settings in bulbs.items():
+        gamut = gamuts.get(address, GAMUT_C) if isinstance(gamuts, dict) else gamuts
+        writes[address.upper()] = _bulb_writes(settings, gamut)
+    return Scene(name, writes)
+
+
+class Scene:
+    def __init__(self, name, writes):
+        self.name = name
+        ## address -> ((uuid, payload), ...) in send order
+        self.writes = {address: tuple((uuid, bytes(payload)) for uuid, payload in bulb_writes)
+                       for address, bulb_writes in writes.items()}
+
+    @property
+    def addresses(self):
+        return list(self.writes)
+
+    def __eq__(self, other):
+        return isinstance(other, Scene) and (self.name, self.writes) == (other.name, other.writes)
+
+    def __repr__(self):
+        return f"Scene({self.name!r}, {len(self.writes)} bulbs)"
+
+    def to_bytes(self):
+        out = bytearray(_MAGIC)
+        _put_string(out, self.name)
+        out += _COUNT.pack(len(self.writes))
+        for address, bulb_writes in self.writes.items():
+            _put_string(out, address)
+            out += _BYTE.pack(len(bulb_writes))
+            for uuid, payload in bulb_writes:
+                out += _BYTE.pack(CHARACTERISTICS.index(uuid))
+                out += _BYTE.pack(len(payload))
+                out += payload
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:len(_MAGIC)] != _MAGIC:
+            raise ValueError("not a cue scene file")
+        try:
+            offset = len(_MAGIC)
+            name, offset = _get_string(data, offset)
+            (count,), offset = _COUNT.unpack_from(data, offset), offset + _COUNT.size
+            writes = {}
+            for _ in range(count):
+                address, offset = _get_string(data, offset)
+                write_count = data[offset]
+                offset += 1
+                bulb_writes = []
+                for _ in range(write_count):
+                    index, length = data[offset], data[offset + 1]
+                    offset += 2
+                    payload = bytes(data[offset:offset + length])
+                    if len(payload) != length:
+                        raise ValueError("truncated payload")
+                    bulb_writes.append((CHARACTERISTICS[index], payload))
+                    offset += length
+                writes[address] = bulb_writes
+        except (IndexError, struct.error) as e:
+            raise ValueError(f"corrupt scene file: {e}") from None
+        return cls(name, writes)
+
+    def save(self, path):
+        ## Written to a temporary file and renamed, like packet tables
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".scene-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(self.to_bytes())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+def _put_string(out, text):
+    encoded = text.encode()
+    out += _BYTE.pack(len(encoded))
+    out += encoded
+
+
+def _get_string(data, offset):
+    length = data[offset]
+    end = offset + 1 + length
+    if end > len(data):
+        raise ValueError("truncated string")
+    return bytes(data[offset + 1:end]).decode(), end
+
+
+class SceneReport:
+    __slots__ = ("scene", "deadline", "started", "landed", "errors")
+
+    def __init__(self, scene, deadline):
+        self.scene = scene
+        self.deadline = deadline
+        ## address -> seconds after the deadline the first write went out / the last one completed
+        self.started = {}
+        self.landed = {}
+        self.errors = {}
+
+    @property
+    def max_skew(self):
+        return max(self.landed.values(), default=0.0)
+
+    @property
+    def spread(self):
+        ## Between the first and the last bulb to finish changing
+        if not self.landed:
+            return 0.0
+        return max(self.landed.values()) - min(self.landed.values())
+
+    def within(self, frame=1 / 60):
+        return not self.errors and self.spread <= frame
+
+    def __repr__(self):
+        return (f"SceneReport({self.scene.name!r}, {len(self.landed)} landed, {len(self.errors)} failed, "
+                f"max skew {self.max_skew * 1000:.1f}ms, spread {self.spread * 1000:.1f}ms)")
+
+
+async def apply_scene(scene, controllers, lead=0.02):
+    ## controllers: {address: HueBleController} or a HueFleet
+    ## lead: seconds from now to the common deadline, time to get every task ready
+    controllers = getattr(controllers, "controllers", controllers)
+    missing = [address for address in scene.writes if address not in controllers]
+    if missing:
+        raise KeyError(f"no controller for {', '.join(missing)}")
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + lead
+    report = SceneReport(scene, deadline)
+    start = asyncio.Event()
+    loop.call_at(deadline, start.set)
+
+    async def send(address):
+        controller = controllers[address]
+        await start.wait()
+        report.started[address] = loop.time() - deadline
+        try:
+            for uuid, payload in scene.writes[address]:
+                await controller.write_payload(uuid, payload)
+        except Exception as e:
+            report.errors[address] = e
+            return
+        report.landed[address] = loop.time() - deadline
+
+    await asyncio.gather(*(send(address) for address in scene.writes))
+    return report
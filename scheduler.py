@@ -0,0 +1,126 @@
+"""
+    Latest-wins write coalescing for a single controller
+
+    Each characteristic (POWER, BRIGHTNESS, TEMP, COLOR) has one pending slot.
+    Submitting a value replaces whatever is still waiting in that slot, and a
+    background task drains the slots no faster than max_rate writes per
+    second. A slider or animation therefore never queues up behind GATT round
+    trips, the bulb just gets the most recent value as soon as the link allows.
+"""
+
+import asyncio
+import time
+
+
+class WriteScheduler:
+    def __init__(self, controller, max_rate=20.0):
+        if max_rate <= 0:
+            raise ValueError(f"max_rate must be positive, got {max_rate}")
+        self.controller = controller
+        self.max_rate = max_rate
+        self.min_interval = 1.0 / max_rate
+
+        ## uuid -> payload, dict order is the order slots became pending
+        self._pending = {}
+        ## uuid -> perf_counter at submit, only kept while instrumented
+        self._submitted_at = {}
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = None
+        self._next_write = 0.0
+
+        ## Counters
+        self.submitted = 0
+        self.written = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.last_error = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self, flush=True):
+        try:
+            if flush:
+                await self.flush()
+        finally:
+            if self._task is not None:
+                self._task.cancel()
+                try:
+                    await self._task
+                except asyncio.CancelledError:
+                    pass
+                self._task = None
+            self._pending.clear()
+            self._submitted_at.clear()
+
+    def submit(self, uuid, payload):
+        ## Copy, callers are free to reuse their buffer right away
+        if uuid in self._pending:
+            self.coalesced += 1
+        self._pending[uuid] = bytes(payload)
+        if self.controller.instrumentation is not None:
+            self._submitted_at[uuid] = time.perf_counter()
+        self.submitted += 1
+        self._wakeup.set()
+
+    async def flush(self):
+        ## Write everything still pending right now, ignoring the rate limit
+        ## Raises the last failure, those values never reached the bulb
+        error = None
+        async with self._lock:
+            while self._pending:
+                error = await self._write_next() or error
+        if error is not None:
+            raise error
+
+    def stats(self):
+        return {
+            "submitted": self.submitted,
+            "written": self.written,
+            "coalesced": self.coalesced,
+            "pending": len(self._pending),
+            "errors": self.errors,
+        }
+
+    async def _write_next(self):
+        uuid = next(iter(self._pending))
+        payload = self._pending.pop(uuid)
+        submitted_at = self._submitted_at.pop(uuid, None)
+        instrumentation = self.controller.instrumentation
+        if instrumentation is not None and submitted_at is not None:
+            instrumentation.record(self.controller.address, uuid, "queue", time.perf_counter() - submitted_at)
+        try:
+            await self.controller._send(uuid, payload)
+            self.written += 1
+        except Exception as e:
+            ## The drain loop keeps going, a later value supersedes it, flush() raises it
+            self.errors += 1
+            self.last_error = e
+            return e
+        finally:
+            self._next_write = asyncio.get_running_loop().time() + self.min_interval
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            while self._pending:
+                delay = self._next_write - loop.time()
+                if delay > 0:
+                    ## Values submitted while sleeping replace the pending ones
+                    await asyncio.sleep(delay)
+                async with self._lock:
+                    if self._pending:
+                        await self._write_next()
@@ -0,0 +1,124 @@
+"""
+    Last known bulb state
+
+    BulbShadow keeps the latest payload for every characteristic, read from
+    the bulb when the controller connects and kept current through GATT
+    notifications where the firmware offers them. The controller updates it
+    with every value it writes and skips writes that would not change it, so
+    repeating power_on or the same brightness costs nothing. The decoded
+    properties give dashboards the bulb state without touching the radio.
+    COLOR holds either layout from codec.py, xy or hsv reports it and the
+    other one is None.
+"""
+
+import time
+
+from codec import decode_brightness, decode_hsv, decode_power, decode_temperature, decode_xy, is_hsv
+from cue import BRIGHTNESS_UUID, CHARACTERISTICS, COLOR_UUID, POWER_UUID, TEMP_UUID
+
+
+class BulbShadow:
+    def __init__(self):
+        ## uuid -> last known payload and when it was learned
+        self._payloads = {}
+        self._updated = {}
+        self.notifying = set()
+
+        self.suppressed = 0
+        self.notifications = 0
+
+    def matches(self, uuid, payload):
+        return self._payloads.get(uuid) == payload
+
+    def update(self, uuid, payload):
+        self._payloads[uuid] = bytes(payload)
+        self._updated[uuid] = time.monotonic()
+
+    def invalidate(self, uuid=None):
+        if uuid is None:
+            self._payloads.clear()
+            self._updated.clear()
+        else:
+            self._payloads.pop(uuid, None)
+            self._updated.pop(uuid, None)
+
+    def payload(self, uuid):
+        return self._payloads.get(uuid)
+
+    def age(self, uuid):
+        ## Seconds since the value was last written, read or notified
+        updated = self._updated.get(uuid)
+        return None if updated is None else time.monotonic() - updated
+
+    async def attach(self, client):
+        ## Seed from the bulb, then follow notifications where supported
+        for uuid in CHARACTERISTICS:
+            try:
+                self.update(uuid, await client.read_gatt_char(uuid))
+            except Exception:
+                ## Not readable on this firmware, learned from writes instead
+                self.invalidate(uuid)
+
+        self.notifying.clear()
+        for uuid in CHARACTERISTICS:
+            try:
+                characteristic = client.services.get_characteristic(uuid)
+                if characteristic is None or "notify" not in characteristic.properties:
+                    continue
+                await client.start_notify(uuid, self._notification_handler(uuid))
+            except Exception:
+                continue
+            self.notifying.add(uuid)
+
+    def _notification_handler(self, uuid):
+        def handle(sender, data):
+            self.notifications += 1
+            self.update(uuid, data)
+        return handle
+
+    def _decoded(self, uuid, decode):
+        payload = self._payloads.get(uuid)
+        if not payload:
+            return None
+        try:
+            return decode(payload)
+        except Exception:
+            return None
+
+    @property
+    def power(self):
+        return self._decoded(POWER_UUID, decode_power)
+
+    @property
+    def brightness(self):
+        return self._decoded(BRIGHTNESS_UUID, decode_brightness)
+
+    @property
+    def temperature(self):
+        return self._decoded(TEMP_UUID, decode_temperature)
+
+    @property
+    def xy(self):
+        payload = self._payloads.get(COLOR_UUID)
+        if payload is None or is_hsv(payload):
+            return None
+        return self._decoded(COLOR_UUID, decode_xy)
+
+    @property
+    def hsv(self):
+        ## (hue 0-360, saturation 0-1) after set_color_hsv
+        payload = self._payloads.get(COLOR_UUID)
+        if payload is None or not is_hsv(payload):
+            return None
+        return self._decoded(COLOR_UUID, decode_hsv)
+
+    def snapshot(self):
+        return {
+            "power": self.power,
+            "brightness": self.brightness,
+            "temperature": self.temperature,
+            "xy": self.xy,
+            "hsv": self.hsv,
+            "suppressed": self.suppressed,
+            "notifying": len(self.notifying),
+        }
@@ -0,0 +1,319 @@
+"""
+    Simulated Hue bulbs for offline load testing
+
+    SimulatedClient has the parts of BleakClient that HueBleController uses:
+    connect, disconnect, is_connected, write_gatt_char, read_gatt_char,
+    start_notify / stop_notify, services.get_characteristic and the
+    disconnected callback, which like bleak's also fires on disconnect().
+    Behind it a SimulatedBulb keeps the power, brightness, temperature and
+    color characteristics.
+
+    A SimulatedNetwork owns any number of bulbs and hands out clients through
+    client_factory, which can be passed straight to HueBleController:
+
+        network = SimulatedNetwork(latency=0.01, jitter=0.005, drop_rate=0.01)
+        controller = HueBleController(address, client_factory=network.client_factory)
+
+    Latency, jitter, write drop rate, MTU, connect time and random link drops
+    are all configurable, add_adapter simulates extra radios with their own
+    link limits and load-dependent latency, and everything runs on the event
+    loop with sleeps, so a single process can simulate hundreds of bulbs.
+"""
+
+import asyncio
+import random
+
+from bleak.exc import BleakError
+
+from codec import POWER_OFF
+from cue import BRIGHTNESS_UUID, COLOR_UUID, POWER_UUID, TEMP_UUID
+
+## ATT header takes 3 bytes of every packet
+ATT_HEADER = 3
+DEFAULT_MTU = 23
+
+
+class SimulatedCharacteristic:
+    __slots__ = ("uuid", "properties", "max_size")
+
+    def __init__(self, uuid, max_size, notify=True):
+        self.uuid = uuid
+        self.max_size = max_size
+        self.properties = ["read", "write", "write-without-response"] + (["notify"] if notify else [])
+
+
+class SimulatedServices:
+    def __init__(self, characteristics):
+        self.characteristics = {c.uuid: c for c in characteristics}
+
+    def get_characteristic(self, uuid):
+        return self.characteristics.get(uuid)
+
+
+class SimulatedBulb:
+    def __init__(self, address, notify=True):
+        self.address = address
+        self.values = {
+            POWER_UUID: POWER_OFF,
+            BRIGHTNESS_UUID: b"\xfe",
+            TEMP_UUID: b"\x6e\x01",
+            COLOR_UUID: b"\x00\x00\x00\x00",
+        }
+        self.services = SimulatedServices([
+            SimulatedCharacteristic(POWER_UUID, 1, notify),
+            SimulatedCharacteristic(BRIGHTNESS_UUID, 1, notify),
+            SimulatedCharacteristic(TEMP_UUID, 2, notify),
+            SimulatedCharacteristic(COLOR_UUID, 5, notify),
+        ])
+        ## Every write the bulb applied, (loop time, uuid, payload)
+        self.history = []
+        self.record_history = False
+        self.writes = 0
+        self._subscribers = {}
+
+    def apply(self, uuid, payload, when):
+        self.values[uuid] = payload
+        self.writes += 1
+        if self.record_history:
+            self.history.append((when, uuid, payload))
+        for callback in list(self._subscribers.get(uuid, ())):
+            callback(self.services.get_characteristic(uuid), bytearray(payload))
+
+
+class SimulatedAdapter:
+    def __init__(self, name, max_links=None, latency=None, link_latency=0.0):
+        ## latency: per operation, the network's when None
+        ## link_latency: added per connected link, a busy radio schedules every link less often
+        self.name = name
+        self.max_links = max_links
+        self.latency = latency
+        self.link_latency = link_latency
+        self.failed = False
+        self.links = set()
+
+    def operation_latency(self, network):
+        base = network.latency if self.latency is None else self.latency
+        return base + self.link_latency * len(self.links)
+
+    def fail(self):
+        ## Radio gone, every link drops and new connects fail until recover()
+        self.failed = True
+        for client in list(self.links):
+            client.drop_link()
+
+    def recover(self):
+        self.failed = False
+
+
+class SimulatedClient:
+    def __init__(self, bulb, network, disconnected_callback=None, adapter=None):
+        self.bulb = bulb
+        self.network = network
+        ## SimulatedAdapter name, None for the network's default radio
+        self.adapter = adapter
+        self.address = bulb.address
+        self.services = bulb.services
+        self.mtu_size = network.mtu
+        self._disconnected_callback = disconnected_callback
+        self._connected = False
+        self._notify = {}
+
+        self.writes = 0
+        self.dropped = 0
+
+    @property
+    def is_connected(self):
+        return self._connected
+
+    def _adapter(self):
+        if self.adapter is None:
+            return None
+        adapter = self.network.adapters.get(self.adapter)
+        if adapter is None:
+            raise BleakError(f"Bluetooth adapter {self.adapter} not found")
+        return adapter
+
+    def _latency(self):
+        adapter = self._adapter()
+        return self.network.latency if adapter is None else adapter.operation_latency(self.network)
+
+    async def connect(self, **kwargs):
+        network = self.network
+        adapter = self._adapter()
+        await asyncio.sleep(network.connect_latency + network.rng.uniform(0, network.jitter))
+        if adapter is not None:
+            if adapter.failed:
+                raise BleakError(f"Bluetooth adapter {adapter.name} is not available")
+            if adapter.max_links is not None and len(adapter.links) >= adapter.max_links:
+                raise BleakError(f"Adapter {adapter.name} has no free connection slots")
+        if network.rng.random() < network.connect_failure_rate:
+            raise BleakError(f"Simulated connect failure for {self.address}")
+        self._connected = True
+        if adapter is not None:
+            adapter.links.add(self)
+        return True
+
+    async def disconnect(self):
+        if self._connected:
+            self._drop_notifications()
+            self._connected = False
+            self._release()
+            ## bleak reports client initiated disconnects through the callback too
+            if self._disconnected_callback is not None:
+                self._disconnected_callback(self)
+        return True
+
+    def _release(self):
+        adapter = self.network.adapters.get(self.adapter)
+        if adapter is not None:
+            adapter.links.discard(self)
+
+    def drop_link(self):
+        ## Simulate the bulb going out of range
+        if not self._connected:
+            return
+        self._drop_notifications()
+        self._connected = False
+        self._release()
+        self.network.link_drops += 1
+        if self._disconnected_callback is not None:
+            self._disconnected_callback(self)
+
+    def _drop_notifications(self):
+        for uuid, callback in self._notify.items():
+            subscribers = self.bulb._subscribers.get(uuid, [])
+            if callback in subscribers:
+                subscribers.remove(callback)
+        self._notify.clear()
+
+    def _check(self, uuid):
+        if not self._connected:
+            raise BleakError(f"Not connected to {self.address}")
+        characteristic = self.services.get_characteristic(uuid)
+        if characteristic is None:
+            raise BleakError(f"Characteristic {uuid} not found")
+        return characteristic
+
+    async def write_gatt_char(self, char_specifier, data, response=None):
+        uuid = getattr(char_specifier, "uuid", char_specifier)
+        characteristic = self._check(uuid)
+        ## Copy now, like bleak, callers may reuse their buffer
+        payload = bytes(data)
+        network = self.network
+
+        if len(payload) > self.mtu_size - ATT_HEADER:
+            raise BleakError(f"Payload of {len(payload)} bytes exceeds MTU {self.mtu_size}")
+        if len(payload) > characteristic.max_size:
+            raise BleakError(f"Invalid attribute value length for {uuid}")
+
+        ## Unacknowledged writes only wait for the packet to go out, None is bleak's default
+        acknowledged = response is None or response
+        latency = self._latency()
+        delay = latency if acknowledged else latency / 2
+        await asyncio.sleep(delay + network.rng.uniform(0, network.jitter))
+        if not self._connected:
+            raise BleakError(f"Disconnected from {self.address} during write")
+
+        self.writes += 1
+        if network.rng.random() < network.drop_rate:
+            self.dropped += 1
+            network.dropped_writes += 1
+            if acknowledged:
+                raise BleakError(f"Simulated ATT timeout writing {uuid}")
+        else:
+            self.bulb.apply(uuid, payload, asyncio.get_running_loop().time())
+
+        if network.rng.random() < network.disconnect_rate:
+            self.drop_link()
+
+    async def read_gatt_char(self, char_specifier, **kwargs):
+        uuid = getattr(char_specifier, "uuid", char_specifier)
+        self._check(uuid)
+        await asyncio.sleep(self._latency() + self.network.rng.uniform(0, self.network.jitter))
+        if not self._connected:
+            raise BleakError(f"Disconnected from {self.address} during read")
+        return bytearray(self.bulb.values[uuid])
+
+    async def start_notify(self, char_specifier, callback, **kwargs):
+        uuid = getattr(char_specifier, "uuid", char_specifier)
+        characteristic = self._check(uuid)
+        if "notify" not in characteristic.properties:
+            raise BleakError(f"Characteristic {uuid} does not support notify")
+        self._notify[uuid] = callback
+        self.bulb._subscribers.setdefault(uuid, []).append(callback)
+
+    async def stop_notify(self, char_specifier):
+        uuid = getattr(char_specifier, "uuid", char_specifier)
+        callback = self._notify.pop(uuid, None)
+        subscribers = self.bulb._subscribers.get(uuid, [])
+        if callback in subscribers:
+            subscribers.remove(callback)
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.disconnect()
+
+
+class SimulatedNetwork:
+    def __init__(self, latency=0.01, jitter=0.0, drop_rate=0.0, mtu=DEFAULT_MTU,
+                 disconnect_rate=0.0, connect_latency=0.05, connect_failure_rate=0.0,
+                 notify=True, seed=None):
+        ## latency and jitter in seconds per operation, drop_rate and disconnect_rate per write
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.mtu = mtu
+        self.disconnect_rate = disconnect_rate
+        self.connect_latency = connect_latency
+        self.connect_failure_rate = connect_failure_rate
+        self.notify = notify
+        self.rng = random.Random(seed)
+
+        self.bulbs = {}
+        self.clients = {}
+        ## name -> SimulatedAdapter, see add_adapter
+        self.adapters = {}
+        self.dropped_writes = 0
+        self.link_drops = 0
+
+    def bulb(self, address):
+        if address not in self.bulbs:
+            self.bulbs[address] = SimulatedBulb(address, self.notify)
+        return self.bulbs[address]
+
+    def add_bulbs(self, count, prefix="SI:MU:LA"):
+        ## Creates count bulbs with made up addresses and returns the addresses
+        addresses = [f"{prefix}:{i >> 16 & 0xFF:02X}:{i >> 8 & 0xFF:02X}:{i & 0xFF:02X}" for i in range(count)]
+        for address in addresses:
+            self.bulb(address)
+        return addresses
+
+    def add_adapter(self, name, max_links=None, latency=None, link_latency=0.0):
+        ## Extra radio, clients pick it with adapter=name like BleakClient(..., adapter="hci1")
+        adapter = self.adapters[name] = SimulatedAdapter(name, max_links, latency, link_latency)
+        return adapter
+
+    def client_factory(self, address, disconnected_callback=None, adapter=None, **kwargs):
+        ## Same call shape as BleakClient(address, disconnected_callback=..., adapter=...)
+        client = SimulatedClient(self.bulb(address), self, disconnected_callback, adapter)
+        self.clients[address] = client
+        return client
+
+    def drop_random_links(self, fraction):
+        ## Disconnect storm, drops the given fraction of connected clients at once
+        connected = [client for client in self.clients.values() if client.is_connected]
+        for client in self.rng.sample(connected, int(len(connected) * fraction)):
+            client.drop_link()
+
+    def stats(self):
+        return {
+            "bulbs": len(self.bulbs),
+            "connected": sum(client.is_connected for client in self.clients.values()),
+            "writes": sum(bulb.writes for bulb in self.bulbs.values()),
+            "dropped_writes": self.dropped_writes,
+            "link_drops": self.link_drops,
+            "adapters": {name: len(adapter.links) for name, adapter in self.adapters.items()},
+        }
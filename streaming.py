@@ -0,0 +1,166 @@
+"""
+    Unacknowledged streaming writes with verified checkpoints
+
+    In streaming mode the controller sends write-without-response packets
+    (response=False, which huetesting.py shows the firmware accepts), so a
+    color change no longer waits for an ATT round trip. Nothing tells us
+    when such a packet is lost, so StreamWriter:
+
+        paces writes with a token bucket (max_rate per second, up to burst
+        back to back) to stay clear of the controller's transmit buffers
+        checkpoints every verify_every writes, and verify_interval seconds
+        after the last checkpoint while anything streamed is unconfirmed,
+        even once the stream has gone quiet, reading each streamed
+        characteristic back and rewriting it with an acknowledged write
+        when the bulb doesn't hold the intended value
+
+    Characteristics that can't be read are checkpointed with an
+    acknowledged write of the intended value instead. Reliable mode, one
+    acknowledged write per command, stays the controller default.
+"""
+
+import asyncio
+
+
+class StreamWriter:
+    def __init__(self, controller, max_rate=50.0, burst=4, verify_every=50, verify_interval=1.0):
+        if max_rate <= 0:
+            raise ValueError(f"max_rate must be positive, got {max_rate}")
+        if burst < 1:
+            raise ValueError(f"burst must be at least 1, got {burst}")
+        self.controller = controller
+        self.max_rate = max_rate
+        self.burst = burst
+        ## 0 / None disables the respective checkpoint trigger
+        self.verify_every = verify_every
+        self.verify_interval = verify_interval
+
+        self._tokens = float(burst)
+        self._refilled = None
+        ## uuid -> last payload streamed, the state a checkpoint confirms
+        self._intended = {}
+        ## Streamed since the last checkpoint
+        self._dirty = set()
+        ## uuid -> whether read-back works for it
+        self._readable_cache = {}
+        self._since_checkpoint = 0
+        self._last_checkpoint = None
+        self._lock = asyncio.Lock()
+        ## Runs the verify_interval checkpoints while _dirty is non-empty
+        self._timer = None
+
+        ## Counters
+        self.streamed = 0
+        self.checkpoints = 0
+        self.reads = 0
+        self.acknowledged = 0
+        self.corrections = 0
+        self.errors = 0
+        self.last_error = None
+
+    async def _pace(self):
+        ## Token bucket, refilled at max_rate up to burst
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self._refilled is None:
+            self._refilled = self._last_checkpoint = now
+        ## Taken before waiting, so concurrent sends each get their own slot and go out in order
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.max_rate) - 1
+        self._refilled = now
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self.max_rate)
+
+    async def send(self, uuid, payload):
+        ## Copied before pacing, the caller's buffer may change while we wait
+        payload = bytes(payload)
+        await self._pace()
+        await self.controller.client.write_gatt_char(uuid, payload, response=False)
+        self._intended[uuid] = payload
+        self._dirty.add(uuid)
+        self.streamed += 1
+        self._since_checkpoint += 1
+
+        if self.verify_every and self._since_checkpoint >= self.verify_every and not self._lock.locked():
+            await self.verify()
+        if self.verify_interval and self._dirty and (self._timer is None or self._timer.done()):
+            self._timer = asyncio.get_running_loop().create_task(self._checkpoint_timer())
+
+    async def _checkpoint_timer(self):
+        loop = asyncio.get_running_loop()
+        while self._dirty:
+            delay = self._last_checkpoint + self.verify_interval - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            client = self.controller.client
+            if client is None or not client.is_connected:
+                ## The next send after a reconnect starts it again
+                return
+            await self.verify()
+
+    async def stop(self):
+        ## Cancel the interval checkpoints, verify() first to confirm what was streamed
+        if self._timer is not None:
+            self._timer.cancel()
+            try:
+                await self._timer
+            except asyncio.CancelledError:
+                pass
+            self._timer = None
+
+    def _readable(self, client, uuid):
+        readable = self._readable_cache.get(uuid)
+        if readable is None:
+            characteristic = client.services.get_characteristic(uuid)
+            readable = self._readable_cache[uuid] = characteristic is not None and "read" in characteristic.properties
+        return readable
+
+    def _settle(self, uuid, verified):
+        ## A newer value may have been streamed while we waited on the bulb
+        if self._intended.get(uuid) == verified:
+            self._dirty.discard(uuid)
+
+    async def verify(self):
+        ## Confirm every streamed characteristic, correcting mismatches
+        ## Returns the number of corrections made
+        async with self._lock:
+            client = self.controller.client
+            corrected = 0
+            for uuid in list(self._dirty):
+                intended = self._intended[uuid]
+                try:
+                    mismatch = False
+                    if self._readable(client, uuid):
+                        actual = bytes(await client.read_gatt_char(uuid))
+                        self.reads += 1
+                        if actual == intended:
+                            self._settle(uuid, intended)
+                            continue
+                        mismatch = True
+                    await client.write_gatt_char(uuid, intended, response=True)
+                    self.acknowledged += 1
+                    corrected += mismatch
+                    self._settle(uuid, intended)
+                except Exception as e:
+                    ## Stays dirty, the next checkpoint tries again
+                    self.errors += 1
+                    self.last_error = e
+                    if self.controller.shadow is not None:
+                        self.controller.shadow.invalidate(uuid)
+
+            self.corrections += corrected
+            self.checkpoints += 1
+            self._since_checkpoint = 0
+            self._last_checkpoint = asyncio.get_running_loop().time()
+            return corrected
+
+    def stats(self):
+        return {
+            "streamed": self.streamed,
+            "checkpoints": self.checkpoints,
+            "reads": self.reads,
+            "acknowledged": self.acknowledged,
+            "corrections": self.corrections,
+            "unverified": len(self._dirty),
+            "errors": self.errors,
+        }
@@ -0,0 +1,191 @@
+"""
+    Synchronous, thread-safe facade
+
+    For host applications that aren't asyncio based. Wrapping every call in
+    asyncio.run() builds a new event loop each time, and the BLE connection
+    dies with it. Instead, one long-lived loop runs in a background thread
+    (EventLoopThread, shared by default) and SyncController forwards calls
+    to a HueBleController living on it:
+
+        bulb = SyncController("C7:46:23:94:4A:14")
+        bulb.connect()
+        bulb.set_colors_rgb(255, 0, 0)              blocks, timeout applies
+        future = bulb.submit("set_brightness", 40)  concurrent.futures.Future
+        bulb.fire("set_colors_rgb", 0, 0, 255)      returns immediately
+
+    Any number of threads may call in. Commands to one bulb run one at a
+    time in submission order on the loop thread, so they never interleave.
+    A blocking call that times out raises TimeoutError but the command still
+    runs to completion.
+"""
+
+import asyncio
+import threading
+
+from cue import HueBleController
+
+
+class EventLoopThread:
+    def __init__(self, name="cue-loop"):
+        self.name = name
+        self.loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return self
+            ready = threading.Event()
+            self.loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._run, args=(ready,), name=self.name, daemon=True)
+            self._thread.start()
+            ready.wait()
+        return self
+
+    def _run(self, ready):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(ready.set)
+        self.loop.run_forever()
+
+        ## Stopped, give whatever is left a chance to clean up
+        pending = asyncio.all_tasks(self.loop)
+        for task in pending:
+            task.cancel()
+        self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+        self.loop.close()
+
+    def in_loop_thread(self):
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro):
+        ## Schedule a coroutine from any thread, returns a concurrent.futures.Future
+        if not self.running:
+            coro.close()
+            raise RuntimeError("event loop thread is not running")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call(self, coro, timeout=None):
+        ## Run a coroutine and block for its result
+        if self.in_loop_thread():
+            coro.close()
+            raise RuntimeError("blocking call from the event loop thread would deadlock, use submit()")
+        return self.submit(coro).result(timeout)
+
+    def stop(self, timeout=5.0):
+        with self._lock:
+            if not self.running:
+                return
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            if not self.in_loop_thread():
+                self._thread.join(timeout)
+            self._thread = None
+
+
+_default_loop = None
+_default_loop_lock = threading.Lock()
+
+
+def default_loop():
+    ## The shared loop thread, started on first use
+    global _default_loop
+    with _default_loop_lock:
+        if _default_loop is None or not _default_loop.running:
+            _default_loop = EventLoopThread().start()
+        return _default_loop
+
+
+class SyncController:
+    def __init__(self, address, loop_thread=None, timeout=10.0, **controller_kwargs):
+        self.loop_thread = loop_thread or default_loop()
+        self.timeout = timeout
+        self.controller = HueBleController(address, **controller_kwargs)
+        ## Created on first use, so it belongs to the loop thread's loop
+        self._lock = None
+
+        ## Failures of fire() calls, nobody else gets to see them
+        self.fire_errors = 0
+        self.last_error = None
+        self._errors_lock = threading.Lock()
+
+    @property
+    def address(self):
+        return self.controller.address
+
+    async def _run(self, name, args):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            result = getattr(self.controller, name)(*args)
+            if asyncio.iscoroutine(result):
+                result = await result
+            return result
+
+    def submit(self, name, *args):
+        ## Queue controller.<name>(*args), returns a concurrent.futures.Future
+        return self.loop_thread.submit(self._run(name, args))
+
+    def call(self, name, *args, timeout=None):
+        ## Run controller.<name>(*args) and wait for it, self.timeout by default
+        return self.loop_thread.call(self._run(name, args), self.timeout if timeout is None else timeout)
+
+    def fire(self, name, *args):
+        ## Fire and forget, errors are only counted
+        future = self.submit(name, *args)
+        future.add_done_callback(self._fire_done)
+        return future
+
+    def _fire_done(self, future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            with self._errors_lock:
+                self.fire_errors += 1
+                self.last_error = error
+
+    def connect(self, timeout=None):
+        return self.call("connect", timeout=timeout)
+
+    def disconnect(self, timeout=None):
+        return self.call("disconnect", timeout=timeout)
+
+    def flush(self, timeout=None):
+        return self.call("flush", timeout=timeout)
+
+    def enable_scheduler(self, max_rate=20.0, timeout=None):
+        ## Latest-wins coalescing, pairs well with fire() for streams
+        return self.call("enable_scheduler", max_rate, timeout=timeout)
+
+    def power_on(self, timeout=None):
+        return self.call("power_on", timeout=timeout)
+
+    def power_off(self, timeout=None):
+        return self.call("power_off", timeout=timeout)
+
+    def set_brightness(self, brightness_percent, timeout=None):
+        return self.call("set_brightness", brightness_percent, timeout=timeout)
+
+    def set_temperature(self, mireds, timeout=None):
+        return self.call("set_temperature", mireds, timeout=timeout)
+
+    def set_colors_xy(self, x, y, timeout=None):
+        return self.call("set_colors_xy", x, y, timeout=timeout)
+
+    def set_color_hsv(self, hue, saturation, timeout=None):
+        return self.call("set_color_hsv", hue, saturation, timeout=timeout)
+
+    def set_colors_rgb(self, r, g, b, timeout=None):
+        return self.call("set_colors_rgb", r, g, b, timeout=timeout)
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, *exc):
+        self.disconnect()
@@ -0,0 +1,67 @@
+"""
+    AdapterScheduler against simulated adapters
+"""
+
+import unittest
+
+from adapters import AdapterScheduler
+from connection import ConnectionManager
+from cue import HueBleController
+from simulator import SimulatedNetwork
+
+
+class AdapterSchedulerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.network = SimulatedNetwork(latency=0.001, seed=0)
+        self.network.add_adapter("hci0", max_links=7)
+        self.network.add_adapter("hci1", max_links=7)
+        self.scheduler = AdapterScheduler(["hci0", "hci1"])
+        self.controllers = [
+            HueBleController(f"AA:00:00:00:00:0{index}", client_factory=self.network.client_factory)
+            for index in range(4)
+        ]
+
+    def adapter(self, name):
+        return self.scheduler.stats()["adapters"][name]
+
+    async def test_move_is_not_a_drop(self):
+        for controller in self.controllers:
+            self.scheduler.place(controller, exclude=["hci1"])
+            await controller.connect()
+        managers = [ConnectionManager(controller) for controller in self.controllers]
+        for manager in managers:
+            await manager.start()
+
+        for controller in self.controllers:
+            _, _, connected = await self.scheduler.move(controller, "hci1")
+            self.assertTrue(connected)
+
+        self.assertEqual(self.adapter("hci1")["drops"], 0)
+        self.assertFalse(self.adapter("hci1")["failed"])
+        self.assertEqual([manager.drops for manager in managers], [0] * len(managers))
+        for manager in managers:
+            await manager.stop()
+
+    async def test_link_drop_is_counted(self):
+        controller = self.controllers[0]
+        name = await self.scheduler.connect(controller)
+        controller.client.drop_link()
+        self.assertEqual(self.adapter(name)["drops"], 1)
+        await controller.disconnect()
+
+    async def test_deliberate_disconnect_stays_down(self):
+        placement = await self.scheduler.connect_all(self.controllers)
+        for controller in self.controllers:
+            if placement[controller.address] == "hci0":
+                await controller.disconnect()
+        self.assertEqual(self.adapter("hci0")["drops"], 0)
+
+        self.scheduler.mark_failed("hci0")
+        self.assertEqual(await self.scheduler.rebalance(), [])
+        for controller in self.controllers:
+            self.assertEqual(controller.client.is_connected, placement[controller.address] == "hci1")
+            await controller.disconnect()
+
+
+if __name__ == "__main__":
+    unittest.main()
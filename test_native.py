@@ -0,0 +1,88 @@
+"""
+    libcue against the Python conversion
+
+    Needs libcue.so (`make`), skipped without it. Run with
+    `python -m unittest test_native` or pytest.
+"""
+
+import itertools
+import time
+import unittest
+
+import native
+from cue import np, rgb_to_xy
+from gamut import GAMUTS
+
+_native = native.load()
+
+## Every 15th level of each channel plus the corners, includes black, white and primaries outside gamut A/B
+_LEVELS = sorted(set(range(0, 256, 15)) | {1, 128, 254, 255})
+_CUBE = list(itertools.product(_LEVELS, repeat=3))
+
+
+def _python(r, g, b, gamut):
+    xy, brightness = rgb_to_xy(r, g, b, gamut)
+    return xy.x, xy.y, brightness
+
+
+@unittest.skipIf(_native is None, "libcue is not built, run make")
+class NativeScalarTest(unittest.TestCase):
+    def test_matches_rgb_to_xy(self):
+        for gamut in GAMUTS.values():
+            mismatched = [rgb for rgb in _CUBE if _native.rgb_to_xy(*rgb, gamut) != _python(*rgb, gamut)]
+            self.assertEqual(mismatched, [], f"gamut {gamut.name}")
+
+    def test_black(self):
+        for gamut in GAMUTS.values():
+            self.assertEqual(_native.rgb_to_xy(0, 0, 0, gamut), _python(0, 0, 0, gamut))
+
+    def test_out_of_gamut_is_clamped(self):
+        ## sRGB primaries fall outside gamut A and B, both sides must land on the same edge point
+        for gamut in GAMUTS.values():
+            for rgb in ((255, 0, 0), (0, 255, 0), (0, 0, 255), (0, 255, 255)):
+                with self.subTest(gamut=gamut.name, rgb=rgb):
+                    x, y, _ = _native.rgb_to_xy(*rgb, gamut)
+                    self.assertEqual((x, y), gamut.clamp(x, y))
+                    self.assertEqual(_native.rgb_to_xy(*rgb, gamut), _python(*rgb, gamut))
+
+
+@unittest.skipIf(_native is None, "libcue is not built, run make")
+@unittest.skipIf(np is None, "rgb_to_xy_batch needs numpy")
+class NativeBatchTest(unittest.TestCase):
+    def test_matches_rgb_to_xy(self):
+        rgb = np.array(_CUBE, dtype=np.uint8)
+        for gamut in GAMUTS.values():
+            xy, brightness = _native.rgb_to_xy_batch(rgb, gamut, np)
+            mismatched = [
+                pixel for row, pixel in enumerate(_CUBE)
+                if (xy[row, 0], xy[row, 1], brightness[row]) != _python(*pixel, gamut)
+            ]
+            self.assertEqual(mismatched, [], f"gamut {gamut.name}")
+
+    def test_empty(self):
+        xy, brightness = _native.rgb_to_xy_batch(np.empty((0, 3), dtype=np.uint8), GAMUTS["C"], np)
+        self.assertEqual(xy.shape, (0, 2))
+        self.assertEqual(brightness.shape, (0,))
+
+    def test_speedup(self):
+        ## Against the per-pixel Python loop it replaces, the margin is orders of magnitude
+        gamut = GAMUTS["C"]
+        pixels = _CUBE * 4
+        rgb = np.array(pixels, dtype=np.uint8)
+
+        start = time.perf_counter()
+        for pixel in pixels:
+            rgb_to_xy(*pixel, gamut)
+        python = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _native.rgb_to_xy_batch(rgb, gamut, np)
+        batch = time.perf_counter() - start
+
+        print(f"\n{len(pixels)} pixels: python {python * 1000:.1f}ms, libcue batch {batch * 1000:.3f}ms, "
+              f"{python / batch:.0f}x")
+        self.assertGreater(python / batch, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+"""
+    WriteScheduler against a simulated bulb
+"""
+
+import asyncio
+import unittest
+
+from codec import encode_brightness
+from cue import BRIGHTNESS_UUID, HueBleController
+from simulator import SimulatedNetwork
+
+ADDRESS = "AA:00:00:00:00:01"
+
+
+class WriteSchedulerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.network = SimulatedNetwork(latency=0.001, seed=0)
+        self.controller = HueBleController(ADDRESS, client_factory=self.network.client_factory)
+        await self.controller.connect()
+        self.controller.enable_scheduler(100.0)
+
+    async def asyncTearDown(self):
+        self.network.drop_rate = 0.0
+        await self.controller.disconnect()
+
+    def brightness(self):
+        return bytes(self.network.bulbs[ADDRESS].values[BRIGHTNESS_UUID])
+
+    async def test_restarts_after_reconnect(self):
+        await self.controller.disconnect()
+        await self.controller.connect()
+        self.assertTrue(self.controller.scheduler.running)
+        await self.controller.set_brightness(90)
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.controller.scheduler.pending, 0)
+        self.assertEqual(self.brightness(), encode_brightness(90))
+
+    async def test_flush_raises_failed_writes(self):
+        self.network.drop_rate = 1.0
+        await self.controller.set_brightness(20)
+        with self.assertRaises(Exception):
+            await self.controller.flush()
+        self.assertEqual(self.controller.scheduler.errors, 1)
+
+    async def test_latest_value_wins(self):
+        for percent in range(0, 101, 10):
+            await self.controller.set_brightness(percent)
+        await self.controller.flush()
+        self.assertEqual(self.brightness(), encode_brightness(100))
+        self.assertGreater(self.controller.scheduler.coalesced, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,330 @@
+"""
+    Command trace recording and replay
+
+    TraceRecorder captures every characteristic write a controller is asked
+    to make (HueBleController.write_payload, so before the scheduler, shadow
+    and streaming layers decide what actually goes over the air) in a
+    compact append-only log. replay_trace plays a log back against real or
+    simulated bulbs at the original timing or N times faster and reports
+    lag, drops and throughput, which makes production load patterns
+    repeatable:
+
+        recorder = TraceRecorder("evening.trace")
+        recorder.attach(controller)
+        ...
+        python tracelog.py info evening.trace
+        python tracelog.py replay evening.trace --speed 4 --simulate
+
+    File layout, little endian: magic and the start time in ns since the
+    epoch, then records. A bulb record (type 0, index, length + address)
+    appears before the first write to that bulb, a write record (type 1,
+    13 bytes before the payload) holds ns since start, bulb index,
+    characteristic index (see cue.CHARACTERISTICS) and length + payload.
+    Offsets come from the monotonic clock, the wall clock is only read for
+    the header, so clock steps can't reorder a log. A record cut short by a
+    crash ends the log.
+"""
+
+import argparse
+import asyncio
+import os
+import struct
+import time
+
+from cue import CHARACTERISTICS
+from instrumentation import Histogram
+
+_MAGIC = b"CUETRC01"
+_HEADER = struct.Struct("<8sQ")
+_BULB = struct.Struct("<BHB")
+_WRITE = struct.Struct("<BQHBB")
+BULB_RECORD = 0
+WRITE_RECORD = 1
+
+
+class TraceEvent:
+    __slots__ = ("time", "address", "uuid", "payload")
+
+    def __init__(self, time, address, uuid, payload):
+        ## Seconds since the trace started
+        self.time = time
+        self.address = address
+        self.uuid = uuid
+        self.payload = payload
+
+    def __repr__(self):
+        return f"TraceEvent({self.time:.6f}, {self.address}, {self.uuid}, {self.payload.hex()})"
+
+
+def _read_records(f):
+    ## (start ns, generator of (type, fields, payload)) for an open trace file
+    header = f.read(_HEADER.size)
+    if len(header) < _HEADER.size or header[:len(_MAGIC)] != _MAGIC:
+        raise ValueError("not a cue trace file")
+    _, start_ns = _HEADER.unpack(header)
+
+    def records():
+        while True:
+            kind = f.read(1)
+            if not kind:
+                return
+            record = _BULB if kind[0] == BULB_RECORD else _WRITE if kind[0] == WRITE_RECORD else None
+            if record is None:
+                raise ValueError(f"corrupt trace, unknown record type {kind[0]}")
+            rest = f.read(record.size - 1)
+            if len(rest) < record.size - 1:
+                return
+            fields = record.unpack(kind + rest)
+            payload = f.read(fields[-1])
+            if len(payload) < fields[-1]:
+                return
+            yield fields, payload
+
+    return start_ns, records()
+
+
+def read_trace(path):
+    ## TraceEvents in recorded order
+    with open(path, "rb") as f:
+        _, records = _read_records(f)
+        addresses = {}
+        for fields, payload in records:
+            if fields[0] == BULB_RECORD:
+                addresses[fields[1]] = payload.decode()
+            else:
+                _, offset_ns, bulb, characteristic, _ = fields
+                yield TraceEvent(offset_ns / 1e9, addresses[bulb], CHARACTERISTICS[characteristic], payload)
+
+
+class TraceRecorder:
+    def __init__(self, path):
+        self.path = path
+        self._indices = {}
+        self.records = 0
+        ## Writes that couldn't be logged, recording never fails a write
+        self.errors = 0
+        self.last_error = None
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            ## Appending, pick up the start time and bulb numbering already in the file
+            valid_size, last_ns = self._recover()
+            ## Carry on from the wall clock time since the start, but never before the last record
+            elapsed_ns = max(time.time_ns() - self.start_ns, last_ns)
+            self._base_ns = time.monotonic_ns() - elapsed_ns
+            self._file = open(path, "r+b")
+            self._file.truncate(valid_size)
+            self._file.seek(valid_size)
+        else:
+            self.start_ns = time.time_ns()
+            self._base_ns = time.monotonic_ns()
+            self._file = open(path, "wb")
+            self._file.write(_HEADER.pack(_MAGIC, self.start_ns))
+
+    def _recover(self):
+        with open(self.path, "rb") as f:
+            self.start_ns, records = _read_records(f)
+            valid_size = f.tell()
+            last_ns = 0
+            for fields, payload in records:
+                if fields[0] == BULB_RECORD:
+                    self._indices[payload.decode()] = fields[1]
+                else:
+                    last_ns = fields[1]
+                valid_size = f.tell()
+        return valid_size, last_ns
+
+    def attach(self, *controllers):
+        for controller in controllers:
+            controller.recorder = self
+
+    def record(self, address, uuid, payload):
+        ## Called from HueBleController.write_payload, a full disk or closed file only costs the record
+        try:
+            index = self._indices.get(address)
+            if index is None:
+                encoded = address.encode()
+                self._file.write(_BULB.pack(BULB_RECORD, len(self._indices), len(encoded)) + encoded)
+                index = self._indices[address] = len(self._indices)
+            record = _WRITE.pack(WRITE_RECORD, time.monotonic_ns() - self._base_ns, index,
+                                 CHARACTERISTICS.index(uuid), len(payload))
+            self._file.write(record + payload)
+        except Exception as e:
+            self.errors += 1
+            self.last_error = e
+            return
+        self.records += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ReplayReport:
+    __slots__ = ("speed", "events", "writes", "drops", "errors", "skipped", "elapsed", "lag")
+
+    def __init__(self, speed):
+        self.speed = speed
+        self.events = 0
+        self.writes = 0
+        ## Superseded while the bulb was still busy with an earlier write
+        self.drops = 0
+        self.errors = 0
+        ## Events for bulbs without a controller
+        self.skipped = 0
+        self.elapsed = 0.0
+        ## How late each event was dispatched relative to its scaled timestamp
+        self.lag = Histogram()
+
+    @property
+    def throughput(self):
+        return self.writes / self.elapsed if self.elapsed else 0.0
+
+    def stats(self):
+        return {
+            "speed": self.speed,
+            "events": self.events,
+            "writes": self.writes,
+            "drops": self.drops,
+            "errors": self.errors,
+            "skipped": self.skipped,
+            "elapsed": self.elapsed,
+            "writes_per_sec": self.throughput,
+            "lag_mean": self.lag.mean,
+            "lag_p99": min(self.lag.percentile(0.99), self.lag.max),
+            "lag_max": self.lag.max,
+        }
+
+    def __repr__(self):
+        return (f"ReplayReport({self.speed:g}x, {self.writes}/{self.events} written, drops={self.drops}, "
+                f"errors={self.errors}, {self.throughput:.0f} writes/s, lag max {self.lag.max * 1000:.1f}ms)")
+
+
+async def replay_trace(events, controllers, speed=1.0, max_gap=None):
+    ## events: TraceEvents (e.g. read_trace(path)), controllers: {address: controller} or a HueFleet
+    ## max_gap: longest idle stretch to keep, in trace seconds, None keeps them all
+    if speed <= 0:
+        raise ValueError(f"speed must be positive, got {speed}")
+    controllers = getattr(controllers, "controllers", controllers)
+    loop = asyncio.get_running_loop()
+    report = ReplayReport(speed)
+    ## address -> (uuid, payload) waiting for the bulb's write in flight
+    pending = {}
+    busy = {}
+
+    async def drain(address, controller):
+        while pending.get(address):
+            uuid, payload = pending[address].pop(0)
+            try:
+                await controller.write_payload(uuid, payload)
+                report.writes += 1
+            except Exception:
+                report.errors += 1
+
+    start = loop.time()
+    skipped_time = 0.0
+    previous = None
+    for event in events:
+        report.events += 1
+        controller = controllers.get(event.address)
+        if controller is None:
+            report.skipped += 1
+            continue
+        if max_gap is not None and previous is not None and event.time - previous > max_gap:
+            skipped_time += event.time - previous - max_gap
+        previous = event.time
+
+        target = start + (event.time - skipped_time) / speed
+        delay = target - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        report.lag.record(max(0.0, loop.time() - target))
+
+        queue = pending.setdefault(event.address, [])
+        ## Latest value wins per characteristic while the bulb is busy
+        for index, (uuid, _) in enumerate(queue):
+            if uuid == event.uuid:
+                del queue[index]
+                report.drops += 1
+                break
+        queue.append((event.uuid, event.payload))
+        task = busy.get(event.address)
+        if task is None or task.done():
+            busy[event.address] = loop.create_task(drain(event.address, controller))
+
+    await asyncio.gather(*busy.values())
+    report.elapsed = loop.time() - start
+    return report
+
+
+def info(path):
+    events = 0
+    first = last = None
+    bulbs = {}
+    for event in read_trace(path):
+        events += 1
+        first = event.time if first is None else first
+        last = event.time
+        bulbs[event.address] = bulbs.get(event.address, 0) + 1
+    duration = (last - first) if events else 0.0
+    return {
+        "events": events,
+        "duration": duration,
+        "bytes": os.path.getsize(path),
+        "bulbs": bulbs,
+        "events_per_sec": events / duration if duration else None,
+    }
+
+
+async def _replay_main(args):
+    from cue import HueBleController
+    from fleet import HueFleet
+
+    addresses = sorted({event.address for event in read_trace(args.trace)})
+    controller_factory = HueBleController
+    if args.simulate:
+        from simulator import SimulatedNetwork
+
+        network = SimulatedNetwork(latency=args.latency, seed=0)
+        controller_factory = lambda address: HueBleController(address, client_factory=network.client_factory)
+
+    fleet = HueFleet(addresses, controller_factory=controller_factory)
+    await fleet.connect()
+    try:
+        report = await replay_trace(read_trace(args.trace), fleet, args.speed, args.max_gap)
+    finally:
+        await fleet.disconnect()
+    print(report)
+    for key, value in report.stats().items():
+        print(f"  {key:16s} {value}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and replay cue command traces")
+    commands = parser.add_subparsers(dest="command", required=True)
+    info_parser = commands.add_parser("info", help="summarize a trace")
+    info_parser.add_argument("trace")
+    replay_parser = commands.add_parser("replay", help="play a trace back against bulbs")
+    replay_parser.add_argument("trace")
+    replay_parser.add_argument("--speed", type=float, default=1.0, help="N times the recorded pace")
+    replay_parser.add_argument("--max-gap", type=float, help="compress idle stretches to this many seconds")
+    replay_parser.add_argument("--simulate", action="store_true", help="use simulated bulbs instead of BLE")
+    replay_parser.add_argument("--latency", type=float, default=0.005, help="simulated write latency")
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        for key, value in info(args.trace).items():
+            print(f"{key:16s} {value}")
+    else:
+        asyncio.run(_replay_main(args))
+
+
+if __name__ == "__main__":
+    main()